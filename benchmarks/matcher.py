@@ -0,0 +1,47 @@
+import sys, time, random, difflib
+from src.utils.local.matcher import LineIndex, find_block
+
+# Micro-benchmark of the SEARCH block matcher on synthetic files.
+# Usage: python -m benchmarks.matcher [lines] [repeats]
+
+def synthetic_file(lines, seed=7):
+    rng = random.Random(seed)
+    words = ["value", "result", "config", "items", "index", "total", "client", "payload", "cache", "buffer"]
+    out = []
+    while len(out) < lines:
+        name = f"{rng.choice(words)}_{len(out)}"
+        out += [f"def {name}({rng.choice(words)}, {rng.choice(words)}=None):", f"    {rng.choice(words)} = {rng.choice(words)}.get('{name}', {rng.randint(0, 999)})", f"    for {rng.choice(words)} in range({rng.randint(1, 50)}):", f"        {rng.choice(words)} += {rng.randint(1, 9)}", f"    return {rng.choice(words)}", ""]
+    return "\n".join(out[:lines]) + "\n"
+
+def cases(content, rng):
+    lines = content.splitlines()
+    first = rng.randrange(len(lines) // 2, len(lines) - 12)
+    block = lines[first:first + 8]
+    exact = "\n".join(block).strip()
+    whitespace = "\n".join("  " + " ".join(line.split()) for line in block)
+    fuzzy = "\n".join(line.replace("+=", "-=").replace("return", "return  ") for line in block)
+    missing = "\n".join(f"class Missing{i}(object): pass" for i in range(8))
+    return {"exact": exact, "whitespace": whitespace, "fuzzy": fuzzy, "miss": missing}
+
+def timed(function, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats): result = function()
+    return (time.perf_counter() - started) / repeats, result
+
+def main(lines=5000, repeats=5):
+    content = synthetic_file(lines)
+    rng = random.Random(lines)
+    seconds, index = timed(lambda: LineIndex(content), repeats)
+    print(f"{lines:,} lines, {len(content):,} chars. LineIndex build: {seconds * 1000:.2f} ms")
+    for name, search in cases(content, rng).items():
+        seconds, match = timed(lambda: find_block(content, search, index=index), repeats)
+        outcome = f"{match.kind} ({match.score:.2f}) at {match.start}" if match else "no match"
+        print(f"  {name:<10} {seconds * 1000:9.2f} ms  {outcome}")
+    # The previous fallback compared the snippet against the whole file as one string.
+    if "--legacy" in sys.argv:
+        seconds, result = timed(lambda: difflib.get_close_matches(cases(content, rng)["fuzzy"], [content], n=1, cutoff=0.6), 1)
+        print(f"  legacy difflib fallback: {seconds * 1000:.2f} ms  {"match" if result else "no match"}")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:] if arg.isdigit()]
+    main(*args)
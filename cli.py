@@ -1,4 +1,4 @@
-import os, getpass, asyncio
+import os, atexit, getpass, asyncio
 from rich.panel import Panel
 from dotenv import load_dotenv
 from tavily import TavilyClient
@@ -10,6 +10,8 @@ from src.utils.basics import cls, terminal
 import src.services.voice.worker as voice_main
 from src.services.voice.test import test_voice_mode
 from src.services.ai.models.worker import chat_with_ai
+from src.services.ai.models.registry import close_clients
+from src.utils.local.terminal import start_code_workers
 from src.services.chat.basics import save_chat, reset_conversation
 
 load_dotenv()
@@ -39,9 +41,15 @@ async def main():
     console.print("Type 'automode [number]' to enter Autonomous mode with a specific number of iterations.")
     console.print("Type 'reset' to clear the conversation history.")
     console.print("Type 'save chat' to save the conversation to a Markdown file.")
+    console.print("Type 'processes' to see the background processes with their CPU and memory use.")
     console.print("Type '11labs on' to enable text-to-speech.")
     console.print("Type '11labs off' to disable text-to-speech.")
     console.print("While in automode, press Ctrl+C at any time to exit the automode to return to regular chat.")
+    # Bring the project index up to date with the files changed since the last session.
+    try:
+        refreshed = await asyncio.to_thread(globals.project_index.refresh)
+        console.print(Panel(f"{refreshed["files"]} files indexed ({refreshed["updated"]} updated, {refreshed["removed"]} removed).", title="Project Index", style="cyan"))
+    except Exception as e: terminal("w", f"Could not refresh the project index: {str(e)}")
     voice_mode = False
     while True:
         if voice_mode:
@@ -78,6 +86,9 @@ async def main():
             tts_enabled = False
             console.print(Panel("Text-to-speech disabled.", style="bold yellow"))
             continue
+        if user_input.lower() == "processes":
+            console.print(Panel(globals.running_processes.report(), title="Background Processes", title_align="left", style="cyan"))
+            continue
         if user_input.lower() == "reset":
             reset_conversation()
             continue
@@ -144,9 +155,26 @@ async def main():
             console.print(Panel("Exited automode. Returning to regular chat.", style="green"))
         else: response, _ = await chat_with_ai(user_input)
 
+async def shutdown():
+    # Stop the background processes (SIGTERM, then SIGKILL) and release the code workers and the provider connection pools.
+    stopped = await globals.running_processes.stop_all()
+    if stopped: console.print(Panel("\n".join(stopped), title="Background Processes", title_align="left", style="cyan"))
+    await globals.code_workers.close()
+    await close_clients()
+
+async def run():
+    # Last resort for exits that skip shutdown().
+    atexit.register(globals.running_processes.kill_all)
+    # Warm up the execute_code interpreters in the background.
+    code_workers_task = asyncio.create_task(start_code_workers())
+    try: await main()
+    finally:
+        code_workers_task.cancel()
+        await shutdown()
+
 if __name__ == "__main__":
     cls()
-    try: asyncio.run(main())
+    try: asyncio.run(run())
     except KeyboardInterrupt: console.print("\nProgram interrupted by user. Exiting...", style="bold red")
     except Exception as e: terminal("e", f"An unexpected error occurred: {str(e)}")
     finally: console.print("Program finished. Goodbye!", style="bold green")
\ No newline at end of file
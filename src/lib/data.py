@@ -1,3 +1,3 @@
 version = "1.0.0 (BETA)"
 
-ignored_folders = {".git", "__pycache__", "node_modules", "venv", "env"}
\ No newline at end of file
+ignored_folders = {".git", "__pycache__", "node_modules", "venv", "env", ".marcus", "code_execution_env"}
\ No newline at end of file
@@ -1,8 +1,21 @@
-# Token tracking variables.
-main_model_tokens = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
-tool_checker_tokens = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
-code_editor_tokens = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
-code_execution_tokens = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
+from src.lib.config import config
+from src.services.chat.history import ConversationHistory
+from src.utils.local.store import FileStore
+from src.utils.local.index import ProjectIndex
+from src.utils.usage import UsageLedger
+from src.utils.cache import ResponseCache
+from src.utils.local.sandbox import WorkerPool
+from src.utils.local.processes import ProcessRegistry
+from src.utils.local.packages import PackageCache
+
+# Token and cost ledger (per call, per turn and per session).
+usage = UsageLedger()
+# Answers to deterministic helper requests, kept on disk between sessions.
+response_cache = ResponseCache(config.ai.response_cache.path, ttl=config.ai.response_cache.ttl_seconds, max_bytes=config.ai.response_cache.max_bytes, enabled=config.ai.response_cache.enabled)
+# Estimated size of the last request of every model against its context window ({"tokens": ..., "window": ...}).
+context_usage = {}
+# Time to first token of every streamed response ({"model": ..., "seconds": ...}).
+time_to_first_token = []
 
 # Sound.
 tts_enabled = True
@@ -12,15 +25,23 @@ microphone = None
 
 # General.
 USE_FUZZY_SEARCH = True
-# Set up the conversation memory (maintains context for MAINMODEL).
-conversation_history = []
-# Store file contents (part of the context for MAINMODEL).
-file_contents = {}
+# Set up the conversation memory (maintains context for MAINMODEL), bounded by a token budget.
+conversation_history = ConversationHistory(config.ai.history.token_budget, keep_recent=config.ai.history.keep_recent_messages)
+# Store file contents (part of the context for MAINMODEL), validated against the disk and bounded by a byte budget.
+file_contents = FileStore(config.ai.file_store.max_bytes)
+# Persistent index of the project in the working directory (paths, hashes, languages and top-level symbols).
+project_index = ProjectIndex(config.ai.index.path, max_age=config.ai.index.max_age_seconds)
 # Code editor memory (maintains some context for CODEEDITORMODEL between calls).
 code_editor_memory = []
 # Files already present in code editor's context.
 code_editor_files = set()
 # Automode flag.
 automode = False
-# Global dictionary to store running processes.
-running_processes = {}
\ No newline at end of file
+# Warm interpreters of code_execution_env that run execute_code jobs.
+code_workers = WorkerPool(config.ai.code_execution.workers, cpu_seconds=config.ai.code_execution.cpu_seconds, memory_mb=config.ai.code_execution.memory_mb, preload=config.ai.code_execution.preload, buffer_bytes=config.ai.code_execution.output_buffer_bytes)
+# Wheel cache and lockfile of the packages installed in code_execution_env.
+packages = PackageCache(config.ai.code_execution.wheel_cache, config.ai.code_execution.lockfile, timeout=config.ai.code_execution.install_timeout)
+# Background jobs of execute_code, by process ID.
+running_processes = ProcessRegistry(config.ai.code_execution.stop_grace_seconds)
+# Exit notices of background processes, passed to the model with the next message.
+process_events = []
\ No newline at end of file
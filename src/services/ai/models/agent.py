@@ -0,0 +1,139 @@
+import json
+from rich.panel import Panel
+from src.lib.config import config
+from rich.markdown import Markdown
+import src.lib.globals as globals
+from src.utils.basics import console, terminal
+from src.utils.telemetry import span
+from src.utils.local.scheduler import run_tools
+from src.utils.tokens import ContextOverflowError
+from src.services.chat.stream import StreamRenderer
+from src.utils.local.worker import edit_and_apply_multiple
+from src.services.ai.prompts.worker import decide_retry
+from src.services.image.converter import encode_image_to_base64
+from src.services.voice.text_to_speech.worker import text_to_speech
+
+# The agent loop shared by every provider (src/services/ai/models/provider.py): send the turn to the main model, run the
+# requested tools concurrently, send every result back in a single tool checker call and record the turn in the history.
+TOOL_CHECKER_TITLE = "Marcus's Response to Tool Result"
+
+async def ask(provider, role, messages, current_iteration=None, max_iterations=None, title="Marcus", speak=False, clear=True):
+    # One model call, streamed or not, recorded in the usage ledger. Returns a Reply.
+    system = provider.system(current_iteration, max_iterations)
+    tools = provider.tools()
+    request = provider.request(role, provider.fit(role, messages, system, tools), system, tools)
+    with span(role, "model", model=request["model"]):
+        if config.ai.stream:
+            async with StreamRenderer(request["model"], title=title, speak=speak, clear=clear) as renderer: response = await provider.stream(request, renderer)
+        else: response = await provider.send(request)
+        globals.usage.record(role, provider.usage(response), provider=provider.name)
+    return provider.parse(response)
+
+def show_files_in_context():
+    if globals.file_contents:
+        globals.files_in_context = "\n".join(globals.file_contents.keys())
+        console.print(Panel(globals.files_in_context, title="Files in Context", title_align="left", border_style="white", expand=False))
+    else: globals.files_in_context = "No files in context. Read, create, or edit files to add."
+
+def remember_files(tool_call, tool_result):
+    # Keep the file store in step with files the tools created or edited.
+    if tool_result.get("is_error"): return
+    if tool_call.name == "create_files":
+        files = tool_call.input.get("files", [])
+        for file in files if isinstance(files, list) else [files]:
+            if isinstance(file, dict) and f"File created and added to system prompt: {file.get("path")}" in str(tool_result["content"]): globals.file_contents[file["path"]] = file.get("content", "")
+    elif tool_call.name == "edit_and_apply_multiple" and isinstance(tool_result["content"], list):
+        for result in tool_result["content"]:
+            if isinstance(result, dict) and result.get("status") in ["success", "partial_success"]: globals.file_contents[result["path"]] = result.get("edited_content", globals.file_contents.get(result["path"], ""))
+
+async def retry_edits(provider, tool_checker_response, tool_calls, tool_results):
+    # For every edit_and_apply_multiple call, let the AI decide whether to retry. Returns the text to add to the response.
+    text = ""
+    for tool_call, tool_result in zip(tool_calls, tool_results):
+        if tool_call.name != "edit_and_apply_multiple": continue
+        tool_input = tool_call.input
+        edit_results = [] if tool_result.get("is_error") else tool_result.get("content", [])
+        retry_decision = await decide_retry(provider.client, tool_checker_response, edit_results, tool_input)
+        if retry_decision["retry"] and retry_decision["files_to_retry"]:
+            console.print(Panel(f"AI has decided to retry editing for files: {', '.join(retry_decision["files_to_retry"])}", style="yellow"))
+            retry_files = [file for file in tool_input["files"] if file["path"] in retry_decision["files_to_retry"]]
+            # Ensure 'instructions' are present.
+            for file in retry_files:
+                if "instructions" not in file: file["instructions"] = "Please reapply the previous instructions."
+            if retry_files:
+                retry_result, retry_console_output = await edit_and_apply_multiple(provider, retry_files, tool_input["project_context"])
+                globals.project_index.mark_stale()
+                console.print(Panel(retry_console_output, title="Retry Result", style="cyan"))
+                text += f"\n\nRetry result: {json.dumps(retry_result, indent=2)}"
+            else: console.print(Panel("No files to retry. Skipping retry.", style="yellow"))
+        else: console.print(Panel("Marcus has decided not to retry editing", style="green"))
+    return text
+
+async def run_turn(provider, user_input, image_path=None, current_iteration=None, max_iterations=None):
+    # Input validation.
+    if not isinstance(user_input, str): terminal("e", "user_input must be a string", exitScript=True)
+    if image_path is not None and not isinstance(image_path, str): terminal("e", "image_path must be a string or None", exitScript=True)
+    if current_iteration is not None and not isinstance(current_iteration, int): terminal("e", "current_iteration must be an integer or None", exitScript=True)
+    if max_iterations is not None and not isinstance(max_iterations, int): terminal("e", "max_iterations must be an integer or None", exitScript=True)
+    # Tell the model about background processes that exited since the previous message.
+    if globals.process_events:
+        notes, globals.process_events = "\n".join(globals.process_events), []
+        console.print(Panel(notes, title="Background Processes", title_align="left", style="cyan"))
+        user_input = f"{notes}\n\n{user_input}"
+    globals.current_conversation = []
+    if image_path:
+        console.print(Panel(f"Processing image at path: {image_path}", title_align="left", title="Image Processing", expand=False, style="yellow"))
+        image_base64 = encode_image_to_base64(image_path)
+        if image_base64.startswith("Error"):
+            console.print(Panel(f"Error encoding image: {image_base64}", title="Error", style="bold red"))
+            return "I'm sorry, there was an error processing the image. Please try again.", False
+        globals.current_conversation.append(provider.user_message(user_input, image_base64))
+        console.print(Panel("Image message added to conversation history", title_align="left", title="Image Added", style="green"))
+    else: globals.current_conversation.append(provider.user_message(user_input))
+    # Keep the history within its token budget (results mirrored in the system prompt were already reduced on append).
+    try: await globals.conversation_history.compact(provider.summarize if config.ai.history.summarize else None)
+    except provider.errors as e:
+        # Without a summary the oldest turns are dropped (the previous summary stays), so the turn itself can still go ahead.
+        console.print(Panel(f"Could not summarize the earlier conversation: {await provider.explain(e)}", title="History", style="yellow"))
+        await globals.conversation_history.compact()
+    history_messages = globals.conversation_history.messages()
+    speak = globals.tts_enabled and globals.use_tts
+    try:
+        # Combine the history with the current conversation to maintain context.
+        reply = await ask(provider, "main_model", history_messages + globals.current_conversation, current_iteration, max_iterations, speak=speak)
+    except ContextOverflowError as e:
+        console.print(Panel(str(e), title="Context Window Exceeded", style="bold red"))
+        return "I'm sorry, this request is too large for the model's context window. Please try with fewer or smaller files.", False
+    except provider.errors as e:
+        console.print(Panel(f"API Error: {await provider.explain(e)}", title="API Error", style="bold red"))
+        return "I'm sorry, there was an error communicating with the AI. Please try again.", False
+    assistant_response = reply.text
+    exit_continuation = "AUTOMODE_COMPLETE" in assistant_response
+    if not config.ai.stream:
+        terminal("ai", assistant_response)
+        if speak: await text_to_speech(assistant_response)
+    show_files_in_context()
+    for tool_call in reply.tool_calls:
+        console.print(Panel(f"Tool Used: {tool_call.name}", style="green"))
+        console.print(Panel(f"Tool Input: {json.dumps(tool_call.input, indent=2)}", style="green"))
+    if reply.tool_calls:
+        # Independent tools run concurrently; every result goes back in a single follow-up call.
+        tool_results = await run_tools(provider, [(tool_call.name, tool_call.input) for tool_call in reply.tool_calls])
+        for tool_call, tool_result in zip(reply.tool_calls, tool_results):
+            if tool_result.get("is_error"): console.print(Panel(str(tool_result["content"]), title="Tool Execution Error", style="bold red"))
+            remember_files(tool_call, tool_result)
+        globals.current_conversation += provider.tool_messages(reply, tool_results)
+        try:
+            tool_reply = await ask(provider, "tool_checker_model", history_messages + globals.current_conversation, current_iteration, max_iterations, title=TOOL_CHECKER_TITLE, speak=speak, clear=False)
+            if not config.ai.stream:
+                console.print(Panel(Markdown(tool_reply.text), title=TOOL_CHECKER_TITLE, title_align="left", border_style="blue", expand=False))
+                if speak: await text_to_speech(tool_reply.text)
+            assistant_response += "\n\n" + tool_reply.text
+            if provider.helpers: assistant_response += await retry_edits(provider, tool_reply.text, reply.tool_calls, tool_results)
+        except (ContextOverflowError, *provider.errors) as e:
+            error_message = f"Error in tool response: {await provider.explain(e) if isinstance(e, provider.errors) else str(e)}"
+            console.print(Panel(error_message, title="Error", style="bold red"))
+            assistant_response += f"\n\n{error_message}"
+    if assistant_response: globals.current_conversation.append({"role": "assistant", "content": assistant_response})
+    globals.conversation_history.extend(globals.current_conversation)
+    return assistant_response, exit_continuation
@@ -0,0 +1,33 @@
+import asyncio
+import src.lib.globals as globals
+from rich.panel import Panel
+from anthropic import APIStatusError
+from src.utils.basics import console
+from src.utils.cache import request_key
+
+# Status codes worth retrying: rate limited and overloaded.
+RETRY_STATUS_CODES = {429, 529}
+
+async def request_with_backoff(make_request, max_retries=3, retry_delay=5):
+    # Await make_request(), retrying with exponential backoff without blocking the event loop.
+    for attempt in range(max_retries):
+        try: return await make_request()
+        except APIStatusError as e:
+            if e.status_code not in RETRY_STATUS_CODES or attempt == max_retries - 1: raise
+            console.print(Panel(f"Rate limit exceeded. Retrying in {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})", title="API Error", style="bold yellow"))
+            await asyncio.sleep(retry_delay)
+            retry_delay *= 2 # Exponential backoff.
+
+async def request_with_cache(role, request, create, accept=None):
+    # Text of a deterministic helper request. An identical earlier request is answered from the response cache instead of a paid
+    # call. accept(text) decides whether a fresh answer may be cached (e.g. only well-formed JSON).
+    cache = globals.response_cache
+    key = request_key(request)
+    text = cache.get(key)
+    if cache.enabled: globals.usage.record_cache(role, hit=text is not None)
+    if text is not None: return text
+    response = await request_with_backoff(lambda: create(**request))
+    globals.usage.record(role, response.usage, provider="anthropic")
+    text = response.content[0].text
+    if accept is None or accept(text): cache.put(key, text)
+    return text
@@ -0,0 +1,86 @@
+from src.utils.usage import model_name
+from src.utils.consumption import preflight
+from src.utils.tokens import count_message_tokens
+
+# What the shared agent loop (src/services/ai/models/agent.py) needs from a model provider. Every provider lives in
+# src/services/ai/models/<name>/worker.py, whose main() returns its Provider; the loop never touches provider-specific formats.
+class ToolCall():
+    __slots__ = ("id", "name", "input")
+
+    def __init__(self, id, name, input):
+        self.id = id
+        self.name = name
+        self.input = input
+
+class Reply():
+    # A model response: its text, the tool calls it requested and the raw provider response.
+    __slots__ = ("text", "tool_calls", "raw")
+
+    def __init__(self, text, tool_calls, raw):
+        self.text = text
+        self.tool_calls = tool_calls
+        self.raw = raw
+
+class Provider():
+    name = None
+    # Exceptions of the provider's API, reported to the user instead of ending the turn.
+    errors = ()
+    # Whether the retry decision after edits can use this provider's client (the other helper requests go through complete).
+    helpers = False
+    # Room left in the context window for the model's reply.
+    max_tokens = 4096
+
+    def __init__(self, client):
+        self.client = client
+
+    def model(self, role):
+        return model_name(self.name, role)
+
+    def count_tokens(self, message):
+        # Estimated tokens of one message in the provider's format.
+        return count_message_tokens(message)
+
+    def fit(self, role, messages, system, tools):
+        return preflight(self.name, role, messages, system=system, tools=tools, max_tokens=self.max_tokens, count=self.count_tokens)
+
+    def user_message(self, user_input, image_base64=None):
+        raise NotImplementedError
+
+    def tools(self):
+        raise NotImplementedError
+
+    def system(self, current_iteration=None, max_iterations=None):
+        raise NotImplementedError
+
+    def request(self, role, messages, system, tools):
+        raise NotImplementedError
+
+    async def send(self, request):
+        raise NotImplementedError
+
+    async def stream(self, request, renderer):
+        # Like send, feeding text deltas and tool names to the renderer as they arrive.
+        raise NotImplementedError
+
+    def usage(self, response):
+        # What UsageLedger.record expects for this provider's responses.
+        return response
+
+    def parse(self, response):
+        raise NotImplementedError
+
+    def tool_messages(self, reply, results):
+        # The assistant message carrying the reply's tool calls, followed by the message(s) with their results.
+        raise NotImplementedError
+
+    async def explain(self, error):
+        # Text shown for one of self.errors.
+        return str(error)
+
+    async def summarize(self, text):
+        raise NotImplementedError
+
+    async def complete(self, role, system, prompt, max_tokens=4096, cached=False):
+        # Text of a one-shot helper request (code editor, execution analysis): a system prompt and a single user message. With
+        # cached, an identical earlier request may be answered from the response cache.
+        raise NotImplementedError
@@ -0,0 +1,35 @@
+import httpx, inspect
+from src.lib.config import config
+
+# Provider clients, created once per process. Every turn reuses the same client, so its HTTP keep-alive pool stays warm and the
+# TCP and TLS handshakes are not repeated per message. Pool sizes and timeouts come from ai.http.
+clients = {}
+
+def http_options():
+    http = config.ai.http
+    return {
+        "limits": httpx.Limits(max_connections=http.max_connections, max_keepalive_connections=http.max_keepalive_connections, keepalive_expiry=http.keepalive_expiry),
+        "timeout": httpx.Timeout(http.read_timeout, connect=http.connect_timeout)
+    }
+
+def get_client(provider, api_key=None):
+    client = clients.get(provider)
+    if client is not None: return client
+    if provider == "anthropic":
+        from anthropic import AsyncAnthropic
+        client = AsyncAnthropic(api_key=api_key, http_client=httpx.AsyncClient(**http_options()))
+    elif provider == "ollama":
+        import ollama
+        client = ollama.AsyncClient(**http_options())
+    else: raise ValueError(f"Unknown provider: {provider}")
+    clients[provider] = client
+    return client
+
+async def close_clients():
+    # Close the connection pools on exit.
+    for client in clients.values():
+        close = getattr(client, "close", None) or getattr(getattr(client, "_client", None), "aclose", None)
+        if close is None: continue
+        result = close()
+        if inspect.isawaitable(result): await result
+    clients.clear()
@@ -1,23 +1,27 @@
 from src.lib.config import config
 from src.services.chat.loader import TermLoading
-import os, importlib, src.lib.globals as globals
+import importlib, src.lib.globals as globals
 from src.utils.basics import terminal
+from src.utils.telemetry import span, tracer
+from src.services.ai.models.agent import run_turn
+from src.utils.consumption import display_token_usage, display_turn_timings
 
 def get_function(module_name, function_name="main"):
     return getattr(importlib.import_module(f"src.services.ai.models.{module_name}.worker"), function_name)
 
 async def chat_with_ai(user_input, image_path=None, current_iteration=None, max_iterations=None):
+    # Every provider module's main() returns its Provider (src/services/ai/models/provider.py); the turn itself is shared.
+    try: provider = get_function(config.ai.default_provider)()
+    except ModuleNotFoundError as e:
+        # Missing dependencies of a provider are not a configuration error.
+        if not (e.name or "").startswith("src.services.ai.models."): raise
+        return terminal("e", "Invalid provider, please check your configuration.", exitScript=True)
     animation: TermLoading = TermLoading()
-    animation.show("Thinking...", finish_message="", failed_message="Failed!❌😨😨")
-    if config.ai.default_provider == "anthropic":
-        ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-        if not ANTHROPIC_API_KEY: terminal("e", "ANTHROPIC_API_KEY not found in environment variables.", exitScript=True)
-        else:
-            get_function("anthropic")(ANTHROPIC_API_KEY)
-            await get_function("anthropic", "chat_with_claude")(user_input, image_path=None, current_iteration=None, max_iterations=None)
-            animation.finished = True
-    if config.ai.default_provider == "ollama":
-        get_function("ollama")()
-        await get_function("ollama", "chat_with_ollama")(user_input, image_path=None, current_iteration=None, max_iterations=None)
-        animation.finished = True
-    else: return terminal("e", "Invalid provider, please check your configuration.", exitScript=True)
\ No newline at end of file
+    # Streamed responses render their own live panel.
+    if not config.ai.stream: animation.show("Thinking...", finish_message="", failed_message="Failed!❌😨😨")
+    globals.usage.start_turn()
+    with span("turn", "turn", provider=config.ai.default_provider, iteration=current_iteration): result = await run_turn(provider, user_input, image_path=image_path, current_iteration=current_iteration, max_iterations=max_iterations)
+    animation.finished = True
+    display_token_usage()
+    display_turn_timings(tracer.flush())
+    return result
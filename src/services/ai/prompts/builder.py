@@ -0,0 +1,44 @@
+class PromptAssembler():
+    def __init__(self):
+        # path -> (content, rendered section, generation of the last change). Insertion order is the prompt order.
+        self.__sections = {}
+        self.__files_prompt = ""
+        self.__dirty = True
+        self.generation = 0
+
+    def sync(self, file_contents):
+        # Re-render only the sections whose content changed since the last call.
+        generation = self.generation + 1
+        for path in [path for path in self.__sections if path not in file_contents]:
+            del self.__sections[path]
+            self.__dirty = True
+        for path, content in file_contents.items():
+            section = self.__sections.get(path)
+            if section is not None:
+                if section[0] is content: continue
+                if section[0] == content:
+                    self.__sections[path] = (content, *section[1:])
+                    continue
+                # Changed files move to the end so the unchanged files keep a stable prefix.
+                del self.__sections[path]
+            self.__sections[path] = (content, f"\n--- {path} ---\n{content}\n", generation)
+            self.generation = generation
+            self.__dirty = True
+
+    def sections(self, file_contents):
+        # Rendered file sections in prompt order, with the generation each one last changed in.
+        self.sync(file_contents)
+        return [(path, rendered, generation) for path, (_, rendered, generation) in self.__sections.items()]
+
+    def files_prompt(self, file_contents):
+        self.sync(file_contents)
+        if self.__dirty:
+            header = f"\n\nFiles already in your context:\n{"\n".join(self.__sections)}\n\nFile Contents:\n"
+            self.__files_prompt = "".join([header, *(section[1] for section in self.__sections.values())])
+            self.__dirty = False
+        return self.__files_prompt
+
+    def reset(self):
+        self.__sections = {}
+        self.__files_prompt = ""
+        self.__dirty = True
@@ -0,0 +1,37 @@
+from typing import Optional
+import src.lib.globals as globals, src.services.ai.prompts.system as system_prompts
+
+# Anthropic caches the prompt prefix up to each cache_control breakpoint (4 at most), in the order tools -> system -> messages.
+# Blocks are laid out from most to least stable so an edit or an iteration bump only invalidates what comes after it:
+#   1. tools (breakpoint on the last tool)
+#   2. base prompt, automode prompt and chain of thought (breakpoint)
+#   3. files unchanged since the previous request (breakpoint on the last one)
+#   4. files changed since the previous request (breakpoint on the last one)
+#   5. volatile state: the list of files in context and the automode iteration counter (never cached)
+EPHEMERAL = {"type": "ephemeral"}
+
+class PromptLayout():
+    def __init__(self, assembler):
+        self.assembler = assembler
+        self.__seen_generation = 0
+
+    def tools(self, tools):
+        if tools: tools[-1]["cache_control"] = EPHEMERAL
+        return tools
+
+    def system(self, current_iteration: Optional[int] = None, max_iterations: Optional[int] = None):
+        static = [system_prompts.BASE_SYSTEM_PROMPT]
+        if globals.automode: static.append(system_prompts.AUTOMODE_SYSTEM_PROMPT.format(iteration_info="iteration counter, given at the end of this system prompt"))
+        static.append(system_prompts.CHAIN_OF_THOUGHT_PROMPT)
+        blocks = [{"type": "text", "text": "\n\n".join(static), "cache_control": EPHEMERAL}]
+        sections = self.assembler.sections(globals.file_contents)
+        stable = [{"type": "text", "text": rendered} for _, rendered, generation in sections if generation <= self.__seen_generation]
+        recent = [{"type": "text", "text": rendered} for _, rendered, generation in sections if generation > self.__seen_generation]
+        self.__seen_generation = self.assembler.generation
+        for files in (stable, recent):
+            if files: files[-1]["cache_control"] = EPHEMERAL
+            blocks += files
+        volatile = f"Files already in your context:\n{"\n".join(path for path, _, _ in sections) or "None"}"
+        if globals.automode and current_iteration is not None and max_iterations is not None: volatile += f"\n\nYou are currently on iteration {current_iteration} out of {max_iterations} in automode."
+        blocks.append({"type": "text", "text": volatile})
+        return blocks
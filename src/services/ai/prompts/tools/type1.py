@@ -142,6 +142,61 @@ tools = [
                 "required": ["query"]
             }
         }
+    },
+    {
+        "worker": "src.utils.local.index",
+        "type": "function",
+        "function": {
+            "name": "query_index",
+            "description": "Find where symbols are defined in the project, or list its files, using the persistent project index",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "symbol": {
+                        "type": "string",
+                        "description": "Name, or part of the name, of the symbol to look for"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "Glob pattern the relative file paths must match"
+                    },
+                    "language": {
+                        "type": "string",
+                        "description": "Only files of this language"
+                    },
+                    "kind": {
+                        "type": "string",
+                        "description": "Only symbols of this kind (class, function, variable...)"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "worker": "src.utils.local.search",
+        "type": "function",
+        "function": {
+            "name": "search_code",
+            "description": "Search the project code and return the best matching snippets with paths and line numbers",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Words or identifiers to look for"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "Glob pattern the relative file paths must match"
+                    },
+                    "language": {
+                        "type": "string",
+                        "description": "Only files of this language"
+                    }
+                },
+                "required": ["query"]
+            }
+        }
     }
 ]
 
@@ -138,6 +138,38 @@ tools = [
             "required": ["process_id"]
         }
     },
+    {
+        "worker": "src.utils.local.terminal",
+        "name": "read_process_output",
+        "description": "Read the output a background process started by execute_code produced since the previous read, or since the given byte offsets. The tool returns the process status (running, or its return code once it exited), the new stdout and stderr text, and the offsets to pass next time. Only the most recent output of each stream is kept, so read long-running processes regularly.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "process_id": {
+                    "type": "string",
+                    "description": "The ID of the process, as returned by the execute_code tool."
+                },
+                "stdout_offset": {
+                    "type": "integer",
+                    "description": "Byte offset in stdout to read from. Defaults to where the previous read stopped; use 0 to read all the stdout still kept."
+                },
+                "stderr_offset": {
+                    "type": "integer",
+                    "description": "Byte offset in stderr to read from. Defaults to where the previous read stopped; use 0 to read all the stderr still kept."
+                }
+            },
+            "required": ["process_id"]
+        }
+    },
+    {
+        "worker": "src.utils.local.terminal",
+        "name": "list_processes",
+        "description": "List the background processes started by the execute_code tool with their status: how long they have been running, their CPU time and current CPU share, and their memory use (including the processes they started), or the return code of those that exited. Use this to check on long-running processes or to find one that is using too many resources.",
+        "input_schema": {
+            "type": "object",
+            "properties": {}
+        }
+    },
     {
         "worker": "src.utils.local.files",
         "name": "read_multiple_files",
@@ -199,20 +231,89 @@ tools = [
             "required": ["query"]
         }
     },
+    {
+        "worker": "src.utils.local.terminal",
+        "name": "install_packages",
+        "description": "Install Python packages into the 'code_execution_env' virtual environment used by the execute_code tool. Pass every package the code needs in a single call: they are resolved together, packages already installed at a matching version are skipped, and wheels come from a local cache first, so installs are fast and work offline once a package has been installed before. The tool returns which packages were skipped and installed, or the pip error.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "packages": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Requirements in pip format (e.g., ['requests', 'numpy>=1.26', 'pandas==2.2.2'])."
+                }
+            },
+            "required": ["packages"]
+        }
+    },
     {
         "worker": "src.utils.local.terminal",
         "name": "run_shell_command",
-        "description": "Execute a shell command and return its output. This tool should be used when you need to run system commands or interact with the operating system. It will return the standard output, standard error, and return code of the executed command.",
+        "description": "Execute a shell command and return its output. This tool should be used when you need to run system commands or interact with the operating system. It will return the standard output, standard error, and return code of the executed command. Long outputs are shortened to their beginning and end. Commands requested in the same response run in parallel, so chain dependent steps in a single command (e.g., with &&). Commands cannot read input, and are killed when they exceed their timeout.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "command": {
                     "type": "string",
                     "description": "The shell command to execute. Ensure the command is safe and appropriate for the current operating system."
+                },
+                "timeout": {
+                    "type": "integer",
+                    "description": "Seconds the command may run before it is killed. Defaults to the configured timeout; raise it for long installs or builds."
                 }
             },
             "required": ["command"]
         }
+    },
+    {
+        "worker": "src.utils.local.index",
+        "name": "query_index",
+        "description": "Query the persistent index of the project in the working directory without reading whole files. With a symbol, it returns where top-level classes, functions, types and variables with a matching name are defined (path, line and kind), exact matches first. Without a symbol, it lists the indexed files matching the other filters. The index is refreshed before every query, so it reflects the files on disk.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "symbol": {
+                    "type": "string",
+                    "description": "Name, or part of the name, of the symbol to look for (e.g., 'ConversationHistory')."
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Glob pattern the relative file paths must match (e.g., 'src/*.py'). Use forward slashes (/) for path separation."
+                },
+                "language": {
+                    "type": "string",
+                    "description": "Only files of this language (e.g., 'python', 'typescript', 'go')."
+                },
+                "kind": {
+                    "type": "string",
+                    "description": "Only symbols of this kind (e.g., 'class', 'function', 'variable', 'interface')."
+                }
+            }
+        }
+    },
+    {
+        "worker": "src.utils.local.search",
+        "name": "search_code",
+        "description": "Search the code of the project in the working directory and return the best matching snippets, ranked with BM25, with their paths and line numbers. Use it to find the code related to a feature, an error message or an identifier and read only the relevant lines instead of whole files. Identifiers match their camelCase and snake_case parts, so 'file store' finds 'FileStore'.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Words or identifiers to look for (e.g., 'retry backoff anthropic')."
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Glob pattern the relative file paths must match (e.g., 'src/**'). Use forward slashes (/) for path separation."
+                },
+                "language": {
+                    "type": "string",
+                    "description": "Only files of this language (e.g., 'python', 'typescript', 'go')."
+                }
+            },
+            "required": ["query"]
+        }
     }
 ]
 
@@ -1,9 +1,19 @@
 from typing import Optional
 from rich.panel import Panel
 from src.lib.config import config
+from src.utils.consumption import preflight
+from src.utils.telemetry import span
 from src.utils.basics import logging, console, terminal
+from src.services.ai.prompts.layout import PromptLayout
+from src.services.ai.prompts.builder import PromptAssembler
+from src.services.ai.models.anthropic.backoff import request_with_cache
 import re, json, difflib, src.lib.globals as globals, src.services.ai.prompts.system as system_prompts
 
+# Keeps the rendered file sections between calls (see update_system_prompt).
+prompt_assembler = PromptAssembler()
+# Cache-friendly system blocks for providers with prompt caching.
+prompt_layout = PromptLayout(prompt_assembler)
+
 def generate_instructions_prompt(file_path, file_content, instructions, project_context, full_file_contents):
     return f"""
         You are an expert coding assistant specializing in web development (CSS, JavaScript, React, Tailwind, Node.JS, Hugo/Markdown). Review the following information carefully:
@@ -67,14 +77,10 @@ def generate_instructions_prompt(file_path, file_content, instructions, project_
         </REPLACE>
         """
 
-async def generate_edit_instructions(response, file_path):
+async def generate_edit_instructions(provider, file_path, file_content, instructions, project_context, full_file_contents):
     try:
-        # Update token usage for code editor.
-        globals.code_editor_tokens["input"] += response.usage.input_tokens
-        globals.code_editor_tokens["output"] += response.usage.output_tokens
-        globals.code_editor_tokens["cache_write"] = response.usage.cache_creation_input_tokens
-        globals.code_editor_tokens["cache_read"] = response.usage.cache_read_input_tokens
-        ai_response_text = response.content[0].text # Extract the text.
+        system = generate_instructions_prompt(file_path, file_content, instructions, project_context, full_file_contents)
+        with span("code_editor_model", "model", path=file_path): ai_response_text = await provider.complete("code_editor_model", system, "Generate SEARCH/REPLACE blocks for the necessary changes.", max_tokens=8000)
         # If ai_response_text is a list, handle it.
         if isinstance(ai_response_text, list): ai_response_text = " ".join(item["text"] if isinstance(item, dict) and "text" in item else str(item) for item in ai_response_text)
         elif not isinstance(ai_response_text, str): ai_response_text = str(ai_response_text)
@@ -98,24 +104,12 @@ async def generate_edit_instructions(response, file_path):
         return [] # Return empty list if any exception occurs.
     
 def update_system_prompt(current_iteration: Optional[int] = None, max_iterations: Optional[int] = None) -> str:
-    chain_of_thought_prompt = """
-    Answer the user's request using relevant tools (if they are available). Before calling a tool, do some analysis within <thinking></thinking> tags. First, think about which of the provided tools is the relevant tool to answer the user's request. Second, go through each of the required parameters of the relevant tool and determine if the user has directly provided or given enough information to infer a value. When deciding if the parameter can be inferred, carefully consider all the context to see if it supports a specific value. If all of the required parameters are present or can be reasonably inferred, close the thinking tag and proceed with the tool call. BUT, if one of the values for a required parameter is missing, DO NOT invoke the function (not even with fillers for the missing params) and instead, ask the user to provide the missing parameters. DO NOT ask for more information on optional parameters if it is not provided.
-
-    Do not reflect on the quality of the returned search results in your response.
-
-    IMPORTANT: Before using the read_multiple_files tool, always check if the files you need are already in your context (system prompt).
-    If the file contents are already available to you, use that information directly instead of calling the read_multiple_files tool.
-    Only use the read_multiple_files tool for files that are not already in your context.
-    When instructing to read a file, always use the full file path.
-    """
-    file_contents_prompt = f"\n\nFiles already in your context:\n{"\n".join(globals.file_contents.keys())}\n\nFile Contents:\n"
-    for path, content in globals.file_contents.items():
-        file_contents_prompt += f"\n--- {path} ---\n{content}\n"
+    file_contents_prompt = prompt_assembler.files_prompt(globals.file_contents)
     if globals.automode:
         iteration_info = ""
         if current_iteration is not None and max_iterations is not None: iteration_info = f"You are currently on iteration {current_iteration} out of {max_iterations} in automode."
-        return system_prompts.BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + system_prompts.AUTOMODE_SYSTEM_PROMPT.format(iteration_info=iteration_info) + "\n\n" + chain_of_thought_prompt
-    else: return system_prompts.BASE_SYSTEM_PROMPT + file_contents_prompt + "\n\n" + chain_of_thought_prompt
+        return "".join([system_prompts.BASE_SYSTEM_PROMPT, file_contents_prompt, "\n\n", system_prompts.AUTOMODE_SYSTEM_PROMPT.format(iteration_info=iteration_info), "\n\n", system_prompts.CHAIN_OF_THOUGHT_PROMPT])
+    else: return "".join([system_prompts.BASE_SYSTEM_PROMPT, file_contents_prompt, "\n\n", system_prompts.CHAIN_OF_THOUGHT_PROMPT])
 
 def validate_ai_response(response_text):
     if isinstance(response_text, list):
@@ -150,15 +144,17 @@ def parse_search_replace_blocks(response_text, use_fuzzy=globals.USE_FUZZY_SEARC
         })
     return blocks
 
+def is_json(text):
+    try: json.loads(text)
+    except ValueError: return False
+    return True
+
 async def decide_retry(client, tool_checker_response, edit_results, tool_input):
     try:
         if not edit_results:
             console.print(Panel("No edits were made or an error occurred. Skipping retry.", title="Info", style="bold yellow"))
             return {"retry": False, "files_to_retry": []}
-        response = client.messages.create(
-            model=config.ai.providers.anthropic.models.tool_checker_model,
-            max_tokens=1000,
-            system="""You are an AI assistant tasked with deciding whether to retry editing files based on the previous edit results and the AI's response. Respond with a JSON object containing 'retry' (boolean) and 'files_to_retry' (list of file paths).
+        system = """You are an AI assistant tasked with deciding whether to retry editing files based on the previous edit results and the AI's response. Respond with a JSON object containing 'retry' (boolean) and 'files_to_retry' (list of file paths).
 
 Example of the expected JSON response:
 {
@@ -166,12 +162,10 @@ Example of the expected JSON response:
     "files_to_retry": ["/path/to/file1.py", "/path/to/file2.py"]
 }
 
-Only return the JSON object, nothing else. Ensure that the JSON is properly formatted with double quotes around property names and string values.""",
-            messages=[
-                {"role": "user", "content": f"Previous edit results: {json.dumps(edit_results)}\n\nAI's response: {tool_checker_response}\n\nDecide whether to retry editing any files."}
-            ]
-        )
-        response_text = response.content[0].text.strip()
+Only return the JSON object, nothing else. Ensure that the JSON is properly formatted with double quotes around property names and string values."""
+        messages = preflight("anthropic", "tool_checker_model", [{"role": "user", "content": f"Previous edit results: {json.dumps(edit_results)}\n\nAI's response: {tool_checker_response}\n\nDecide whether to retry editing any files."}], system=system, max_tokens=1000)
+        request = {"model": config.ai.providers.anthropic.models.tool_checker_model, "max_tokens": 1000, "system": system, "messages": messages}
+        with span("decide_retry", "model"): response_text = (await request_with_cache("tool_checker_model", request, client.messages.create, accept=is_json)).strip()
         # Handle list of dicts if necessary.
         if isinstance(response_text, list): response_text = " ".join( item["text"] if isinstance(item, dict) and "text" in item else str(item) for item in response_text)
         elif not isinstance(response_text, str): response_text = str(response_text)
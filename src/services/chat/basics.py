@@ -1,6 +1,6 @@
 from rich.panel import Panel
 from rich.syntax import Syntax
-from typing import AsyncIterable
+from typing import AsyncIterable, Union
 from src.utils.basics import console
 from src.utils.consumption import display_token_usage
 import json, difflib, datetime, src.lib.globals as globals
@@ -28,31 +28,35 @@ def save_chat():
     return filename
 
 def reset_conversation():
-    globals.conversation_history = []
-    globals.main_model_tokens = {"input": 0, "output": 0}
-    globals.tool_checker_tokens = {"input": 0, "output": 0}
-    globals.code_editor_tokens = {"input": 0, "output": 0}
-    globals.code_execution_tokens = {"input": 0, "output": 0}
-    globals.file_contents = {}
+    globals.conversation_history.clear()
+    globals.usage.reset()
+    globals.context_usage.clear()
+    globals.file_contents.clear()
     globals.code_editor_files = set()
     reset_code_editor_memory()
     console.print(Panel("Conversation history, token counts, file contents, code editor memory, and code editor files have been reset.", title="Reset", style="bold green"))
     display_token_usage()
 
-async def text_chunker(text: str) -> AsyncIterable[str]:
-    # Split text into chunks, ensuring to not break sentences.
+async def text_chunker(text: Union[str, AsyncIterable[str]]) -> AsyncIterable[str]:
+    # Split text into chunks, ensuring to not break sentences. Accepts a whole string or a stream of text deltas.
     splitters = (".", ",", "?", "!", ";", ":", "—", "-", "(", ")", "[", "]", "}", " ")
     buffer = ""
-    for char in text:
-        if buffer.endswith(splitters):
-            yield buffer + " "
-            buffer = char
-        elif char in splitters:
-            yield buffer + char + " "
-            buffer = ""
-        else: buffer += char
+    async for piece in as_stream(text):
+        for char in piece:
+            if buffer.endswith(splitters):
+                yield buffer + " "
+                buffer = char
+            elif char in splitters:
+                yield buffer + char + " "
+                buffer = ""
+            else: buffer += char
     if buffer: yield buffer + " "
 
+async def as_stream(text):
+    if isinstance(text, str): yield text
+    else:
+        async for piece in text: yield piece
+
 def reset_code_editor_memory():
     globals.code_editor_memory = []
     console.print(Panel("Code editor memory has been reset.", title="Reset", style="bold green"))
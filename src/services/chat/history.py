@@ -0,0 +1,121 @@
+import json
+from src.utils.tokens import count_message_tokens
+
+# Tool results whose payload already lives in the system prompt.
+PROMPT_MIRRORED = ("File contents updated in system prompt", "File created and added to system prompt", "has been read and stored in the system prompt")
+MIRRORED_NOTE = "[Result omitted: the file contents are in the system prompt.]"
+EVICTED_NOTE = "[Tool result evicted from the conversation history to stay within the token budget.]"
+
+def result_text(block):
+    content = block.get("content")
+    if isinstance(content, list): return "".join(item.get("text", "") for item in content if isinstance(item, dict))
+    return str(content or "")
+
+def replace_results(message, note, only_mirrored=False):
+    # Copy of the message with its tool_result payloads replaced by note. Returns None when nothing changed.
+    if message.get("role") == "tool":
+        if message.get("content") in (note, EVICTED_NOTE) or (only_mirrored and not any(keyword in str(message.get("content", "")) for keyword in PROMPT_MIRRORED)): return None
+        return {**message, "content": note}
+    if not isinstance(message.get("content"), list): return None
+    changed = False
+    content = []
+    for block in message["content"]:
+        if isinstance(block, dict) and block.get("type") == "tool_result" and result_text(block) not in (note, EVICTED_NOTE):
+            if not only_mirrored or any(keyword in result_text(block) for keyword in PROMPT_MIRRORED):
+                block = {**block, "content": [{"type": "text", "text": note}]}
+                changed = True
+        content.append(block)
+    return {**message, "content": content} if changed else None
+
+def starts_turn(message):
+    # A user message that is not carrying tool results.
+    if message.get("role") != "user": return False
+    content = message.get("content")
+    return not isinstance(content, list) or not any(isinstance(block, dict) and block.get("type") == "tool_result" for block in content)
+
+def render_for_summary(messages):
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list): content = "\n".join(block.get("text") or result_text(block) or json.dumps(block.get("input", ""), default=str) for block in content if isinstance(block, dict))
+        lines.append(f"{message.get("role", "user").upper()}: {content or json.dumps(message.get("tool_calls", ""), default=str)}")
+    return "\n\n".join(lines)
+
+class ConversationHistory():
+    def __init__(self, token_budget, keep_recent=6):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary = None
+        self.clear()
+
+    def clear(self):
+        self.__messages = []
+        self.__tokens = []
+        self.__evicted_upto = 0
+        self.summary = None
+        self.total_tokens = 0
+
+    def append(self, message):
+        # O(1): results mirrored in the system prompt are reduced to a note once, here, instead of re-filtering the history every turn.
+        message = replace_results(message, MIRRORED_NOTE, only_mirrored=True) or message
+        tokens = count_message_tokens(message)
+        self.__messages.append(message)
+        self.__tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def extend(self, messages):
+        for message in messages: self.append(message)
+
+    def messages(self):
+        if self.summary is None: return list(self.__messages)
+        return [{"role": "user", "content": f"Summary of the earlier conversation:\n{self.summary}"}, {"role": "assistant", "content": "Understood. I will continue from there."}] + self.__messages
+
+    def __len__(self):
+        return len(self.__messages)
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def __getitem__(self, index):
+        return self.__messages[index]
+
+    def __set(self, index, message):
+        tokens = count_message_tokens(message)
+        self.total_tokens += tokens - self.__tokens[index]
+        self.__messages[index] = message
+        self.__tokens[index] = tokens
+
+    def evict(self):
+        # Drop old tool_result payloads, oldest first, until the history fits the budget. The most recent messages are kept intact.
+        limit = max(0, len(self.__messages) - self.keep_recent)
+        while self.total_tokens > self.token_budget and self.__evicted_upto < limit:
+            evicted = replace_results(self.__messages[self.__evicted_upto], EVICTED_NOTE)
+            if evicted is not None: self.__set(self.__evicted_upto, evicted)
+            self.__evicted_upto += 1
+        return self.total_tokens <= self.token_budget
+
+    def split_oldest(self):
+        # Index of the first turn to keep so the history fits the budget. Cuts only where a user turn starts, so no tool result loses its tool call.
+        excess = self.total_tokens - self.token_budget
+        limit = max(0, min(len(self.__messages) - 1, len(self.__messages) - self.keep_recent))
+        dropped = 0
+        for index in range(1, limit + 1):
+            dropped += self.__tokens[index - 1]
+            if dropped >= excess and starts_turn(self.__messages[index]): return index
+        for index in range(limit, 0, -1):
+            if starts_turn(self.__messages[index]): return index
+        return 0
+
+    async def compact(self, summarize=None):
+        # Keep the history within token_budget: evict old tool results first, then summarize (or drop) the oldest turns.
+        if self.evict(): return
+        cut = self.split_oldest()
+        if not cut: return
+        oldest = self.__messages[:cut]
+        if summarize is not None:
+            previous = f"Previous summary:\n{self.summary}\n\n" if self.summary else ""
+            self.summary = await summarize(previous + render_for_summary(oldest))
+        self.__messages = self.__messages[cut:]
+        self.__tokens = self.__tokens[cut:]
+        self.__evicted_upto = max(0, self.__evicted_upto - cut)
+        self.total_tokens = sum(self.__tokens)
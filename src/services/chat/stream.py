@@ -0,0 +1,72 @@
+import re, time, asyncio
+from rich.live import Live
+from rich.panel import Panel
+from rich.markdown import Markdown
+import src.lib.globals as globals
+from src.utils.basics import cls, console
+from src.services.voice.text_to_speech.worker import text_to_speech
+
+SENTENCE_END = re.compile(r'[.!?:](\s|$)')
+
+class StreamRenderer():
+    def __init__(self, model, title="Marcus", border_style="blue", speak=False, clear=True):
+        self.model = model
+        self.title = title
+        self.border_style = border_style
+        self.speak = speak
+        self.clear = clear
+        self.text = ""
+        self.tools = []
+        self.ttft = None
+        self.started_at = None
+        self.__live = None
+        self.__tts_queue = None
+        self.__tts_task = None
+
+    async def __aenter__(self):
+        self.started_at = time.perf_counter()
+        if self.clear: cls()
+        # The panel is rebuilt at refresh time only, so markdown is not re-parsed on every delta.
+        self.__live = Live(console=console, get_renderable=self.__render, refresh_per_second=12, vertical_overflow="visible")
+        self.__live.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__live.refresh()
+        self.__live.stop()
+        if self.__tts_task is not None:
+            self.__tts_queue.put_nowait(None)
+            await self.__tts_task
+        elif self.speak and self.text and exc_type is None: await text_to_speech(self.text)
+        if self.ttft is not None: console.print(f"Time to first token ({self.model}): {self.ttft:.2f}s", style="dim")
+        return False
+
+    def __render(self):
+        subtitle = f"Tools requested: {', '.join(self.tools)}" if self.tools else None
+        return Panel(Markdown(self.text) if self.text else "Thinking...", title=self.title, title_align="left", subtitle=subtitle, subtitle_align="left", border_style=self.border_style, expand=False)
+
+    def reset(self):
+        # Forget what a failed attempt rendered, before the request is retried.
+        self.text = ""
+        self.tools = []
+
+    def note_tool(self, name):
+        self.tools.append(name)
+
+    def feed(self, delta):
+        if not delta: return
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started_at
+            globals.time_to_first_token.append({"model": self.model, "seconds": self.ttft})
+        self.text += delta
+        if not self.speak: return
+        if self.__tts_task is not None: self.__tts_queue.put_nowait(delta)
+        elif SENTENCE_END.search(self.text):
+            # Start speaking as soon as the first sentence is complete.
+            self.__tts_queue = asyncio.Queue()
+            self.__tts_queue.put_nowait(self.text)
+            self.__tts_task = asyncio.create_task(text_to_speech(self.__drain_tts()))
+
+    async def __drain_tts(self):
+        while (chunk := await self.__tts_queue.get()) is not None:
+            yield chunk
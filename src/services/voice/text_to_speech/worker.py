@@ -1,11 +1,13 @@
 import os, json, base64, asyncio, websockets
 import src.services.voice.worker as voice_main
+from src.utils.telemetry import traced
 from src.services.chat.basics import text_chunker
 from src.utils.basics import logging, console, terminal
 
 VOICE_ID = "YOUR VOICE ID"
 MODEL_ID = "eleven_turbo_v2_5"
 
+@traced("text_to_speech", "tts")
 async def text_to_speech(text):
     ELEVEN_LABS_API_KEY = os.getenv("ELEVEN_LABS_API_KEY")
     if not ELEVEN_LABS_API_KEY: return terminal("e", "ElevenLabs API key not found. Text-to-speech is disabled.")
@@ -44,9 +46,11 @@ async def text_to_speech(text):
             await stream_task
     except websockets.exceptions.InvalidStatusCode as e:
         terminal("e", f"Failed to connect to ElevenLabs API: {e}", style="bold red")
-        console.print("Fallback: Printing the text instead.", style="bold yellow")
-        console.print(text)
+        if isinstance(text, str):
+            console.print("Fallback: Printing the text instead.", style="bold yellow")
+            console.print(text)
     except Exception as e:
         terminal("e", f"Error in text-to-speech: {str(e)}", style="bold red")
-        console.print("Fallback: Printing the text instead.", style="bold yellow")
-        console.print(text)
\ No newline at end of file
+        if isinstance(text, str):
+            console.print("Fallback: Printing the text instead.", style="bold yellow")
+            console.print(text)
\ No newline at end of file
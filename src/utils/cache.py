@@ -0,0 +1,63 @@
+import os, json, time, sqlite3, hashlib, threading
+
+# On-disk cache of model answers to deterministic helper requests (decide_retry, code execution analysis), which are often sent
+# again verbatim: the same code and error after a failed retry, the same edit results. Entries are keyed by a hash of the model,
+# system prompt, messages and max_tokens, expire after ttl seconds and are evicted least recently used first beyond max_bytes.
+# Call sites opt in by going through request_with_cache (src/services/ai/models/anthropic/backoff.py).
+SCHEMA = "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT, size INTEGER, created REAL, accessed REAL)"
+
+def request_key(request):
+    # Hash of the fields that decide the answer. Headers and cache_control markers do not.
+    def strip(value):
+        if isinstance(value, dict): return {key: strip(item) for key, item in value.items() if key != "cache_control"}
+        if isinstance(value, list): return [strip(item) for item in value]
+        return value
+    fields = {key: strip(request.get(key)) for key in ("model", "system", "messages", "max_tokens", "temperature")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class ResponseCache():
+    def __init__(self, path, ttl=86400, max_bytes=10 * 1024 * 1024, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.__connection = None
+        self.__lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self.__connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.__connection.execute(SCHEMA)
+        return self.__connection
+
+    def get(self, key):
+        if not self.enabled: return None
+        now = time.time()
+        try:
+            with self.__lock, self.connection as db:
+                row = db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None: return None
+                if self.ttl and now - row[1] > self.ttl:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                return row[0]
+        except sqlite3.Error: return None
+
+    def put(self, key, text):
+        if not self.enabled: return
+        now = time.time()
+        size = len(text.encode("utf-8"))
+        try:
+            with self.__lock, self.connection as db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, text, size, now, now))
+                if self.ttl: db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if self.max_bytes and total > self.max_bytes:
+                    for old_key, old_size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+                        if total <= self.max_bytes: break
+                        db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                        total -= old_size
+        except sqlite3.Error: pass
@@ -1,52 +1,64 @@
 from src.utils.basics import console
-from src.lib.globals import main_model_tokens, tool_checker_tokens, code_editor_tokens, code_execution_tokens
+from src.services.chat.history import starts_turn
+import src.lib.globals as globals
+from src.utils.usage import ROLES, UsageLedger
+from src.utils.tokens import ContextOverflowError, context_window, count_message_tokens, count_request_tokens
+
+def preflight(provider, model, messages, system=None, tools=None, max_tokens=0, count=count_message_tokens):
+    # Size a request locally before sending it. When it would overflow the model's context window the oldest turns are dropped
+    # (only where a user turn starts, so tool results keep their tool calls); if it still does not fit, ContextOverflowError is
+    # raised instead of paying for a request that is bound to fail. count(message) estimates one message. Returns the messages to send.
+    window = context_window(provider, model)
+    sizes = [count(message) for message in messages]
+    fixed = count_request_tokens(system=system, tools=tools) + max_tokens
+    total, cut = fixed + sum(sizes), 0
+    for index in range(1, len(messages)):
+        if total <= window: break
+        if starts_turn(messages[index]): total, cut = fixed + sum(sizes[index:]), index
+    if total > window: raise ContextOverflowError(f"The {model.replace("_", " ")} request needs about {total:,} tokens (including {max_tokens:,} for the response) but its context window is {window:,}.")
+    if cut: console.print(f"Dropped the {cut} oldest messages from this request to fit the {model.replace("_", " ")} context window ({window:,} tokens).", style="yellow")
+    globals.context_usage[model] = {"tokens": total - max_tokens, "window": window}
+    return messages[cut:]
 
 def display_token_usage():
     from rich.table import Table
     from rich.box import ROUNDED
+    ledger = globals.usage
     table = Table(box=ROUNDED)
     table.add_column("Model", style="cyan")
+    table.add_column("Calls", style="white")
     table.add_column("Input", style="magenta")
     table.add_column("Output", style="magenta")
     table.add_column("Cache Write", style="blue")
     table.add_column("Cache Read", style="blue")
     table.add_column("Total", style="green")
-    table.add_column(f"% of Context ({200000:,})", style="yellow")
+    table.add_column("Model Time (s)", style="white")
+    table.add_column("Response Cache", style="blue")
+    table.add_column("Last Request / Context", style="yellow")
     table.add_column("Cost ($)", style="red")
-    model_costs = {
-        "Main Model": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30, "has_context": True},
-        "Tool Checker": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30, "has_context": False},
-        "Code Editor": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30, "has_context": True},
-        "Code Execution": {"input": 3.00, "output": 15.00, "cache_write": 3.75, "cache_read": 0.30, "has_context": False}
-    }
-    total_input = 0
-    total_output = 0
-    total_cache_write = 0
-    total_cache_read = 0
-    total_cost = 0
-    total_context_tokens = 0
-    for model, tokens in [("Main Model", main_model_tokens), ("Tool Checker", tool_checker_tokens), ("Code Editor", code_editor_tokens), ("Code Execution", code_execution_tokens)]:
-        input_tokens = tokens["input"]
-        output_tokens = tokens["output"]
-        cache_write_tokens = tokens["cache_write"]
-        cache_read_tokens = tokens["cache_read"]
-        total_tokens = input_tokens + output_tokens + cache_write_tokens + cache_read_tokens
-        total_input += input_tokens
-        total_output += output_tokens
-        total_cache_write += cache_write_tokens
-        total_cache_read += cache_read_tokens
-        input_cost = (input_tokens / 1_000_000) * model_costs[model]["input"]
-        output_cost = (output_tokens / 1_000_000) * model_costs[model]["output"]
-        cache_write_cost = (cache_write_tokens / 1_000_000) * model_costs[model]["cache_write"]
-        cache_read_cost = (cache_read_tokens / 1_000_000) * model_costs[model]["cache_read"]
-        model_cost = input_cost + output_cost + cache_write_cost + cache_read_cost
-        total_cost += model_cost
-        if model_costs[model]["has_context"]:
-            total_context_tokens += total_tokens
-            percentage = (total_tokens / 200000) * 100
-        else: percentage = 0
-        table.add_row(model, f"{input_tokens:,}", f"{output_tokens:,}", f"{cache_write_tokens:,}", f"{cache_read_tokens:,}", f"{total_tokens:,}", f"{percentage:.2f}%" if model_costs[model]["has_context"] else "Doesn't save context", f"${model_cost:.3f}")
-    grand_total = total_input + total_output + total_cache_write + total_cache_read
-    total_percentage = (total_context_tokens / 200000) * 100
-    table.add_row("Total", f"{total_input:,}", f"{total_output:,}", f"{total_cache_write:,}", f"{total_cache_read:,}", f"{grand_total:,}", f"{total_percentage:.2f}%", f"${total_cost:.3f}", style="bold")
-    console.print(table)
\ No newline at end of file
+    def row(name, usage, context="", **style):
+        # Model time is only reported by Ollama.
+        table.add_row(name, f"{usage.calls:,}", f"{usage.input:,}", f"{usage.output:,}", f"{usage.cache_write:,}", f"{usage.cache_read:,}", f"{usage.total:,}", f"{usage.seconds:.2f}" if usage.seconds else "-", f"{usage.response_hits} hits / {usage.response_misses} misses" if usage.response_hits + usage.response_misses else "-", context, f"${usage.cost:.3f}", **style)
+    for key, name in ROLES.items():
+        usage = ledger.session[key]
+        if key == "summary_model" and not usage.calls: continue
+        # Estimated size of the model's last request against its own context window.
+        window_usage = globals.context_usage.get(key)
+        row(name, usage, f"{window_usage["tokens"]:,} / {window_usage["window"]:,} ({window_usage["tokens"] / window_usage["window"]:.1%})" if window_usage else "No requests yet")
+    turn = UsageLedger.total(ledger.turn)
+    row("This Turn", turn, style="italic")
+    row("Total", UsageLedger.total(ledger.session), style="bold")
+    console.print(table)
+    if turn.calls and turn.cache_read + turn.cache_write: console.print(f"Prompt cache hit ratio this turn: {turn.cache_hit_ratio:.1%} of input tokens read from cache.", style="blue")
+
+def display_turn_timings(spans):
+    # Where the time of a turn went, from its telemetry spans. Concurrent spans overlap, so the categories can add up to more than the turn.
+    turn = next((span for span in spans if span.category == "turn"), None)
+    if turn is None: return
+    busy = {}
+    for span in spans:
+        if span.category == "turn": continue
+        seconds, count = busy.get(span.category, (0.0, 0))
+        busy[span.category] = (seconds + span.duration, count + 1)
+    details = ", ".join(f"{category} {seconds:.2f}s ({count} call{"s" if count != 1 else ""})" for category, (seconds, count) in busy.items())
+    console.print(f"Turn took {turn.duration:.2f}s" + (f": {details}." if details else "."), style="blue")
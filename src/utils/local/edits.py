@@ -0,0 +1,72 @@
+import os, re, bisect, tempfile
+from typing import NamedTuple, Optional
+from src.utils.local.matcher import Match, LineIndex, find_block, find_exact
+
+# Mode of newly created files (0666 minus the umask). The umask can only be read by setting it, so it is read once, at import.
+UMASK = os.umask(0)
+os.umask(UMASK)
+NEW_FILE_MODE = 0o666 & ~UMASK
+
+class PlannedEdit(NamedTuple):
+    number: int
+    search: str
+    replace: str
+    match: Optional[Match]
+    error: Optional[str]
+
+def plan_edits(original_content, edit_instructions, threshold: Optional[float] = 0.8):
+    # Locate every SEARCH block against the original content, so an edit can never match text inserted by another one.
+    index = LineIndex(original_content)
+    starts, spans, plan = [], [], []
+    for number, edit in enumerate(edit_instructions, 1):
+        search = edit["search"].strip()
+        replace = re.sub(r'</?SEARCH>|</?REPLACE>', "", edit["replace"].strip())
+        match = find_block(original_content, search, threshold, index)
+        # Repeated exact blocks target the next occurrence, as they did when edits were applied one after another.
+        candidate = match
+        while candidate and candidate.kind == "exact" and overlapping(starts, spans, candidate):
+            candidate = find_exact(original_content, search, candidate.start + 1)
+        match = candidate or match
+        if match is None: plan.append(PlannedEdit(number, search, replace, None, "content not found"))
+        elif other := overlapping(starts, spans, match): plan.append(PlannedEdit(number, search, replace, None, f"overlaps edit {other[2]}"))
+        else:
+            position = bisect.bisect_left(starts, match.start)
+            starts.insert(position, match.start)
+            spans.insert(position, (match.start, match.end, number))
+            plan.append(PlannedEdit(number, search, replace, match, None))
+    return plan
+
+def overlapping(starts, spans, match):
+    # The accepted (start, end, number) span that the match overlaps, if any.
+    position = bisect.bisect_left(starts, match.start)
+    if position > 0 and spans[position - 1][1] > match.start: return spans[position - 1]
+    if position < len(spans) and spans[position][0] < match.end: return spans[position]
+    return None
+
+def render_plan(original_content, plan):
+    # Build the edited content in one pass over the accepted edits, in file order.
+    pieces, cursor = [], 0
+    for edit in sorted((edit for edit in plan if edit.match), key=lambda edit: edit.match.start):
+        pieces += [original_content[cursor:edit.match.start], edit.replace]
+        cursor = edit.match.end
+    pieces.append(original_content[cursor:])
+    return "".join(pieces)
+
+def write_atomic(path, content):
+    # Write to a temporary file next to the target and rename it over, so readers never see a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file with 0600: keep the mode of the target, or give a new file the usual one.
+        try: mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError: mode = NEW_FILE_MODE
+        os.chmod(temporary_path, mode)
+        os.replace(temporary_path, path)
+    except BaseException:
+        try: os.remove(temporary_path)
+        except OSError: pass
+        raise
@@ -1,7 +1,8 @@
-import os, glob
+import os
+import src.lib.globals as globals
+from src.utils.local.walker import walk, match
 
 def create_files(files):
-    global file_contents
     results = []
     # Handle different input types.
     if isinstance(files, str): files = [{"path": files, "content": ""}]
@@ -21,7 +22,7 @@ def create_files(files):
             if dir_name: os.makedirs(dir_name, exist_ok=True)
             with open(path, "w") as f:
                 f.write(content)
-            file_contents[path] = content
+            globals.file_contents[path] = content
             results.append(f"File created and added to system prompt: {path}")
         except Exception as e: results.append(f"Error creating file: {str(e)}")
     return "\n".join(results)
@@ -33,20 +34,20 @@ def read_multiple_files(paths, recursive=False):
     for path in paths:
         try:
             abs_path = os.path.abspath(path)
-            if os.path.isdir(abs_path):
-                if recursive: file_paths = glob.glob(os.path.join(abs_path, "**", "*"), recursive=True)
-                else: file_paths = glob.glob(os.path.join(abs_path, "*"))
-                file_paths = [f for f in file_paths if os.path.isfile(f)]
-            else: file_paths = glob.glob(abs_path, recursive=recursive)
+            if os.path.isdir(abs_path): found, truncated = walk(abs_path, recursive=recursive)
+            elif any(char in abs_path for char in "*?["): found, truncated = match(abs_path, recursive=recursive)
+            else: found, truncated = [(abs_path, None)], False
+            file_paths = [file_path for file_path, _ in found]
+            if truncated: results.append(f"Only the first {len(file_paths)} files of '{path}' are read: the walk limits were reached.")
             for file_path in file_paths:
                 abs_file_path = os.path.abspath(file_path)
                 if os.path.isfile(abs_file_path):
-                    if abs_file_path not in globals.file_contents:
-                        with open(abs_file_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                        globals.file_contents[abs_file_path] = content
-                        results.append(f"File '{abs_file_path}' has been read and stored in the system prompt.")
-                    else: results.append(f"File '{abs_file_path}' is already in the system prompt. No need to read again.")
+                    status = globals.file_contents.load(abs_file_path)
+                    if status == "read": results.append(f"File '{abs_file_path}' has been read and stored in the system prompt.")
+                    elif status == "refreshed": results.append(f"File '{abs_file_path}' changed on disk, so it has been read and stored in the system prompt again.")
+                    else: results.append(f"File '{abs_file_path}' is already in the system prompt and up to date. No need to read again.")
                 else: results.append(f"Skipped '{abs_file_path}': Not a file.")
         except Exception as e: results.append(f"Error reading path '{path}': {str(e)}")
+    evicted = globals.file_contents.take_evicted()
+    if evicted: results.append(f"Removed from the system prompt to stay within the file budget (least recently used): {", ".join(evicted)}")
     return "\n".join(results)
\ No newline at end of file
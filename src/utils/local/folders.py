@@ -1,9 +1,15 @@
-import os, mimetypes
-from src.lib.config import config
+import os, codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from src.utils.basics import terminal
+from src.utils.local.walker import walk, list_dir
+
+# Bytes sniffed to tell text from binary files, and readers used by scan_folder.
+SNIFF_BYTES = 8192
+SCAN_WORKERS = min(8, (os.cpu_count() or 1) + 4)
 
 def list_files(path="."):
-    try: return "\n".join(os.listdir(path))
+    try: return "\n".join(list_dir(path))
     except Exception as e: return f"Error listing files: {str(e)}"
 
 def validate_files_structure(files):
@@ -15,41 +21,64 @@ def validate_files_structure(files):
         if not isinstance(file["path"], str) or not isinstance(file["instructions"], str): terminal("e", "'path' and 'instructions' must be strings.", exitScript=True)
     return files
 
+def is_text_file(file_path):
+    # Sniff the first bytes instead of trusting the extension: NUL bytes or invalid UTF-8 mean binary.
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if b"\0" in head: return False
+    try: codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError: return False
+    return True
+
+def read_section(file_path, relative_path, limit):
+    # Markdown section for one file, reading at most limit characters of it. None for binary files.
+    try:
+        if not is_text_file(file_path): return None
+        header = f"## {relative_path}\n\n```\n"
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read(max(0, limit - len(header)) + 1)
+        return False, f"{header}{content}\n```\n\n"
+    except Exception as e: return True, f"## {relative_path}\n\nError reading file: {str(e)}\n\n"
+
 def scan_folder(folder_path: str, output_file: str) -> str:
-    markdown_content = f"# Folder Scan: {folder_path}\n\n"
-    total_chars = len(markdown_content)
+    # Files are read by a thread pool, a bounded window ahead of the writer, and written to output_file in walk order.
+    # Every reader stops at the budget left when it was scheduled, which can only shrink, so no file is read past it.
     max_chars = 600000 # Approximating 150,000 tokens.
-    for root, dirs, files in os.walk(folder_path):
-        dirs[:] = [d for d in dirs if d not in config.ignored_folders]
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, folder_path)
-            mime_type, _ = mimetypes.guess_type(file_path)
-            if mime_type and mime_type.startswith("text"):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    file_content = f"## {relative_path}\n\n```\n{content}\n```\n\n"
-                    if total_chars + len(file_content) > max_chars:
-                        remaining_chars = max_chars - total_chars
-                        if remaining_chars > 0:
-                            truncated_content = file_content[:remaining_chars]
-                            markdown_content += truncated_content
-                            markdown_content += "\n\n... Content truncated due to size limitations ...\n"
-                        else: markdown_content += "\n\n... Additional files omitted due to size limitations ...\n"
-                        break
-                    else:
-                        markdown_content += file_content
-                        total_chars += len(file_content)
-                except Exception as e:
-                    error_msg = f"## {relative_path}\n\nError reading file: {str(e)}\n\n"
-                    if total_chars + len(error_msg) <= max_chars:
-                        markdown_content += error_msg
-                        total_chars += len(error_msg)
-        if total_chars >= max_chars: break
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(markdown_content)
-    return f"Folder scan complete. Markdown file created at: {output_file}. Total characters: {total_chars}"
+    output_path = os.path.abspath(output_file)
+    with open(output_file, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        header = f"# Folder Scan: {folder_path}\n\n"
+        out.write(header)
+        total_chars = len(header)
+        found, truncated = walk(folder_path)
+        files = ((path, os.path.relpath(path, folder_path)) for path, _ in found if path != output_path)
+        pending = deque()
+        def schedule():
+            while len(pending) < SCAN_WORKERS * 4:
+                entry = next(files, None)
+                if entry is None: return
+                pending.append(executor.submit(read_section, *entry, max_chars - total_chars))
+        schedule()
+        while pending:
+            section = pending.popleft().result()
+            if section is not None:
+                is_error, text = section
+                remaining = max_chars - total_chars
+                if len(text) > remaining:
+                    if is_error: continue
+                    if remaining > 0:
+                        out.write(text[:remaining])
+                        out.write("\n\n... Content truncated due to size limitations ...\n")
+                    else: out.write("\n\n... Additional files omitted due to size limitations ...\n")
+                    total_chars = max_chars
+                    break
+                out.write(text)
+                total_chars += len(text)
+            schedule()
+        for future in pending: future.cancel()
+        if truncated and total_chars < max_chars: out.write(f"\n\n... Only the first {len(found)} files were scanned: the walk limits were reached ...\n")
+    result = f"Folder scan complete. Markdown file created at: {output_file}. Total characters: {total_chars}"
+    if truncated: result += f". Only the first {len(found)} files were scanned: the walk limits were reached."
+    return result
 
 def create_folders(paths):
     results = []
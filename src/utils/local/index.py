@@ -0,0 +1,200 @@
+import os, re, ast, time, sqlite3, hashlib, threading
+from src.utils.local.walker import walk
+from src.utils.local.search import chunk_terms, bm25
+from src.utils.local.folders import is_text_file
+from concurrent.futures import ThreadPoolExecutor
+
+# Persistent index of the project under the working directory: path, size, hash and language of every file, plus its top-level
+# symbols. It lives in SQLite, survives sessions and is refreshed with a stat diff, so only new or changed files are read again.
+# The model queries it through the query_index and search_code tools instead of loading whole files into the system prompt.
+# Bump SCHEMA_VERSION when the tables change: an index with another version is rebuilt from scratch.
+SCHEMA_VERSION = 3
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, language TEXT);
+CREATE TABLE IF NOT EXISTS symbols (path TEXT, name TEXT, kind TEXT, line INTEGER);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, path TEXT, start INTEGER, end INTEGER, length INTEGER);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+CREATE TABLE IF NOT EXISTS postings (term TEXT, chunk INTEGER, tf INTEGER);
+CREATE INDEX IF NOT EXISTS postings_term ON postings (term);
+CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk);
+"""
+# Files larger than this are indexed without symbols or searchable content.
+MAX_CONTENT_BYTES = 1024 * 1024
+MAX_RESULTS = 50
+
+LANGUAGES = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".ts": "typescript", ".tsx": "typescript",
+    ".go": "go", ".rs": "rust", ".java": "java", ".kt": "kotlin", ".cs": "csharp", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp", ".hpp": "cpp",
+    ".rb": "ruby", ".php": "php", ".swift": "swift", ".sh": "shell", ".md": "markdown", ".json": "json", ".yml": "yaml", ".yaml": "yaml",
+    ".toml": "toml", ".html": "html", ".css": "css", ".scss": "css", ".sql": "sql"
+}
+# Top-level definitions (no indentation) for the languages without a parser at hand. Each pattern captures (kind, name).
+SYMBOL_PATTERNS = {
+    "javascript": r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?(function|class|const|let|var)\*?\s+([A-Za-z_$][\w$]*)",
+    "typescript": r"^(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?(function|class|interface|type|enum|const|let|var)\*?\s+([A-Za-z_$][\w$]*)",
+    "go": r"^(func|type|var|const)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)",
+    "rust": r"^(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(fn|struct|enum|trait|type|mod|const|static)\s+([A-Za-z_]\w*)",
+    "java": r"^(?:(?:public|private|protected|abstract|final|static|sealed)\s+)*(class|interface|enum|record)\s+([A-Za-z_]\w*)",
+    "kotlin": r"^(?:(?:public|private|internal|abstract|open|data|sealed)\s+)*(class|interface|object|fun|val|var)\s+([A-Za-z_]\w*)",
+    "csharp": r"^(?:(?:public|private|protected|internal|abstract|sealed|static|partial)\s+)*(class|interface|enum|struct|record)\s+([A-Za-z_]\w*)",
+    "ruby": r"^(class|module|def)\s+([A-Za-z_]\w*)",
+    "php": r"^(?:(?:abstract|final)\s+)?(function|class|interface|trait)\s+([A-Za-z_]\w*)",
+    "swift": r"^(?:(?:public|private|internal|open|final)\s+)*(func|class|struct|enum|protocol)\s+([A-Za-z_]\w*)",
+    "shell": r"^(?:(function)\s+)?([A-Za-z_][\w-]*)\s*\(\)"
+}
+SYMBOL_REGEXES = {language: re.compile(pattern, re.MULTILINE) for language, pattern in SYMBOL_PATTERNS.items()}
+
+def language_of(path):
+    return LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+def extract_symbols(text, language):
+    # [(name, kind, line)] of the top-level definitions of a file.
+    if language == "python":
+        try: tree = ast.parse(text)
+        except (SyntaxError, ValueError): return []
+        symbols = []
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef): symbols.append((node.name, "class", node.lineno))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)): symbols.append((node.name, "function", node.lineno))
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                symbols += [(target.id, "variable", node.lineno) for target in targets if isinstance(target, ast.Name)]
+        return symbols
+    regex = SYMBOL_REGEXES.get(language)
+    if regex is None: return []
+    return [(match.group(2), match.group(1) or "function", text.count("\n", 0, match.start()) + 1) for match in regex.finditer(text)]
+
+def index_file(path, size):
+    # (hash, language, symbols, chunks) of one file, read from disk.
+    with open(path, "rb") as f:
+        data = f.read()
+    language = language_of(path)
+    symbols, chunks = [], []
+    if size <= MAX_CONTENT_BYTES and is_text_file(path):
+        text = data.decode("utf-8", errors="replace")
+        symbols = extract_symbols(text, language)
+        chunks = chunk_terms(text)
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), language, symbols, chunks
+
+class ProjectIndex():
+    def __init__(self, path, root=".", max_age=None):
+        self.path = path
+        self.root = os.path.abspath(root)
+        # Seconds after which the index is refreshed even if no tool wrote files (the user may edit them meanwhile).
+        self.max_age = max_age
+        self.__connection = None
+        # Tools run in worker threads: one connection, shared under a lock.
+        self.__lock = threading.Lock()
+        # The stats and time of the last refresh. Queries reuse them until a tool writes files (see mark_stale) or max_age passes.
+        self.__refreshed = None
+        self.__refreshed_at = 0
+
+    @property
+    def connection(self):
+        if self.__connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.__connection = sqlite3.connect(self.path, check_same_thread=False)
+            if self.__connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self.__connection.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS symbols; DROP TABLE IF EXISTS chunks; DROP TABLE IF EXISTS postings;")
+                self.__connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.__connection.executescript(SCHEMA)
+        return self.__connection
+
+    def mark_stale(self):
+        # Called after every tool that may write files, so the next query sees what it changed.
+        self.__refreshed = None
+
+    def refresh(self, force=False):
+        # Stat diff against the stored files: new or changed files are read and parsed again, missing files are dropped.
+        with self.__lock:
+            fresh = not self.max_age or time.monotonic() - self.__refreshed_at < self.max_age
+            if self.__refreshed is not None and fresh and not force: return self.__refreshed
+            db = self.connection
+            known = {path: (size, mtime) for path, size, mtime in db.execute("SELECT path, size, mtime FROM files")}
+            # The index covers the whole project, so it is not bound by the walker limits of the file tools (a truncated walk
+            # would drop every file past the limit from the index).
+            found, _ = walk(self.root, max_files=0, max_bytes=0)
+            current, changed = set(), []
+            for path, size in found:
+                relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+                current.add(relative)
+                try: mtime = os.stat(path).st_mtime_ns
+                except OSError: continue
+                if known.get(relative) != (size, mtime): changed.append((relative, path, size, mtime))
+            removed = [path for path in known if path not in current]
+            with ThreadPoolExecutor() as executor:
+                indexed = list(executor.map(lambda item: self.__safe_index(item[1], item[2]), changed))
+            with db:
+                for path in removed + [relative for relative, *_ in changed]:
+                    db.execute("DELETE FROM files WHERE path = ?", (path,))
+                    db.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                    db.execute("DELETE FROM postings WHERE chunk IN (SELECT id FROM chunks WHERE path = ?)", (path,))
+                    db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+                for (relative, _, size, mtime), result in zip(changed, indexed):
+                    if result is None: continue
+                    digest, language, symbols, chunks = result
+                    db.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?)", (relative, size, mtime, digest, language))
+                    db.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?)", [(relative, name, kind, line) for name, kind, line in symbols])
+                    for start, end, counts in chunks:
+                        chunk = db.execute("INSERT INTO chunks (path, start, end, length) VALUES (?, ?, ?, ?)", (relative, start, end, sum(counts.values()))).lastrowid
+                        db.executemany("INSERT INTO postings VALUES (?, ?, ?)", [(term, chunk, tf) for term, tf in counts.items()])
+            self.__refreshed = {"files": len(current), "updated": len(changed), "removed": len(removed)}
+            self.__refreshed_at = time.monotonic()
+            return self.__refreshed
+
+    @staticmethod
+    def __safe_index(path, size):
+        try: return index_file(path, size)
+        except OSError: return None
+
+    def query(self, symbol=None, path=None, language=None, kind=None):
+        # Symbols matching every given filter: exact names first, then partial matches. Without a symbol, the matching files.
+        with self.__lock:
+            db = self.connection
+            if symbol is None:
+                sql, params = "SELECT path, language, size FROM files WHERE 1 = 1", []
+                if path: sql, params = sql + " AND path GLOB ?", params + [path]
+                if language: sql, params = sql + " AND language = ?", params + [language]
+                return [{"path": row[0], "language": row[1], "size": row[2]} for row in db.execute(sql + " ORDER BY path LIMIT ?", params + [MAX_RESULTS])]
+            pattern = re.sub(r"([%_\\])", r"\\\1", symbol)
+            sql = "SELECT s.path, s.name, s.kind, s.line, f.language FROM symbols s JOIN files f ON f.path = s.path WHERE s.name LIKE ? ESCAPE '\\'"
+            params = [f"%{pattern}%"]
+            if path: sql, params = sql + " AND s.path GLOB ?", params + [path]
+            if language: sql, params = sql + " AND f.language = ?", params + [language]
+            if kind: sql, params = sql + " AND s.kind = ?", params + [kind]
+            sql += " ORDER BY s.name = ? DESC, lower(s.name) = lower(?) DESC, length(s.name), s.path, s.line LIMIT ?"
+            return [{"path": row[0], "name": row[1], "kind": row[2], "line": row[3], "language": row[4]} for row in db.execute(sql, params + [symbol, symbol, MAX_RESULTS])]
+
+    def search(self, terms, path=None, language=None, limit=MAX_RESULTS):
+        # [(path, first line, last line, score)] of the chunks that best match terms under BM25, optionally filtered by path glob and language.
+        # The filters apply to the corpus itself, so document frequencies and lengths are those of the filtered chunks.
+        with self.__lock:
+            db = self.connection
+            where, params = "", []
+            if path: where, params = where + " AND c.path GLOB ?", params + [path]
+            if language: where, params = where + " AND f.language = ?", params + [language]
+            chunks, average_length = db.execute(f"SELECT count(*), avg(c.length) FROM chunks c JOIN files f ON f.path = c.path WHERE 1 = 1{where}", params).fetchone()
+            if not chunks: return []
+            scores, locations = {}, {}
+            for term in set(terms):
+                rows = db.execute(f"SELECT p.chunk, p.tf, c.length, c.path, c.start, c.end FROM postings p JOIN chunks c ON c.id = p.chunk JOIN files f ON f.path = c.path WHERE p.term = ?{where}", [term] + params).fetchall()
+                for chunk, tf, length, *location in rows:
+                    scores[chunk] = scores.get(chunk, 0.0) + bm25(tf, length, len(rows), chunks, average_length)
+                    locations[chunk] = location
+            return [(*locations[chunk], scores[chunk]) for chunk in sorted(scores, key=scores.get, reverse=True)[:limit]]
+
+    def close(self):
+        with self.__lock:
+            if self.__connection is not None: self.__connection.close()
+            self.__connection = None
+
+def query_index(index, symbol=None, path=None, language=None, kind=None):
+    try:
+        index.refresh()
+        results = index.query(symbol, path, language, kind)
+    except sqlite3.Error as e: return f"Error querying the project index: {str(e)}"
+    if not results: return "No matches in the project index."
+    if symbol is None: return "\n".join(f"{result["path"]} ({result["language"] or "unknown"}, {result["size"]} bytes)" for result in results)
+    return "\n".join(f"{result["path"]}:{result["line"]} {result["kind"]} {result["name"]}" for result in results)
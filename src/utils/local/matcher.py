@@ -0,0 +1,105 @@
+import heapq
+from difflib import SequenceMatcher
+from collections import Counter
+from typing import NamedTuple, Optional
+
+# Number of windows that get a full SequenceMatcher comparison after the token prefilter.
+FUZZY_CANDIDATES = 8
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    score: float
+    kind: str # "exact", "whitespace" or "fuzzy".
+
+def normalize(line):
+    return " ".join(line.split())
+
+class LineIndex():
+    # Line offsets and whitespace-normalized lines of a file, built once and shared by every lookup against it.
+    def __init__(self, content):
+        self.content = content
+        self.lines = content.splitlines(keepends=True)
+        self.offsets = [0]
+        for line in self.lines: self.offsets.append(self.offsets[-1] + len(line))
+        self.normalized = [normalize(line) for line in self.lines]
+        self.positions = {}
+        for number, line in enumerate(self.normalized):
+            if line: self.positions.setdefault(line, []).append(number)
+        self.tokens = [line.split() for line in self.normalized]
+
+    def span(self, first, last):
+        # Offsets from the first non-blank character of line `first` to the end of the text on line `last`.
+        start = self.offsets[first] + len(self.lines[first]) - len(self.lines[first].lstrip())
+        end = self.offsets[last] + len(self.lines[last].rstrip())
+        return start, max(start, end)
+
+def search_lines(search):
+    lines = [normalize(line) for line in search.splitlines()]
+    while lines and not lines[0]: lines.pop(0)
+    while lines and not lines[-1]: lines.pop()
+    return lines
+
+def find_exact(content, search, start=0) -> Optional[Match]:
+    position = content.find(search, start)
+    if position == -1 or not search: return None
+    return Match(position, position + len(search), 1.0, "exact")
+
+def find_normalized(index, search) -> Optional[Match]:
+    # Line-by-line match ignoring differences in indentation and inner whitespace. Blank lines in the file are skipped.
+    wanted = [line for line in search_lines(search) if line]
+    if not wanted: return None
+    for first in index.positions.get(wanted[0], []):
+        number, matched = first, 0
+        while number < len(index.normalized) and matched < len(wanted):
+            if index.normalized[number]:
+                if index.normalized[number] != wanted[matched]: break
+                matched += 1
+            number += 1
+        if matched == len(wanted): return Match(*index.span(first, number - 1), 1.0, "whitespace")
+    return None
+
+def find_fuzzy(index, search, threshold=0.8) -> Optional[Match]:
+    # Slide a window of the search block's height over the file. A running token overlap (Dice coefficient) ranks the windows
+    # in linear time and only the best few are scored with SequenceMatcher on normalized text.
+    wanted = search_lines(search)
+    height = len(wanted)
+    if not height or height > len(index.lines): return None
+    wanted_tokens = Counter(token for line in wanted for token in line.split())
+    wanted_total = sum(wanted_tokens.values())
+    window, window_total, common = Counter(), 0, 0
+    def add(number, sign):
+        nonlocal window_total, common
+        for token in index.tokens[number]:
+            if sign > 0:
+                if window[token] < wanted_tokens.get(token, 0): common += 1
+                window[token] += 1
+            else:
+                window[token] -= 1
+                if window[token] < wanted_tokens.get(token, 0): common -= 1
+            window_total += sign
+    candidates = []
+    for number in range(len(index.lines)):
+        add(number, 1)
+        if number >= height: add(number - height, -1)
+        if number >= height - 1 and window_total + wanted_total:
+            dice = 2 * common / (window_total + wanted_total)
+            if dice >= threshold / 2: candidates.append((dice, number - height + 1))
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2("\n".join(wanted))
+    best = None
+    for _, first in heapq.nlargest(FUZZY_CANDIDATES, candidates):
+        matcher.set_seq1("\n".join(index.normalized[first:first + height]))
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold: continue
+        score = matcher.ratio()
+        if score >= threshold and (best is None or score > best.score): best = Match(*index.span(first, first + height - 1), score, "fuzzy")
+    return best
+
+def find_block(content, search, threshold: Optional[float] = 0.8, index: Optional[LineIndex] = None) -> Optional[Match]:
+    # Exact match first, then whitespace-insensitive, then fuzzy (skipped when threshold is None).
+    match = find_exact(content, search)
+    if match: return match
+    index = index if index is not None and index.content is content else LineIndex(content)
+    match = find_normalized(index, search)
+    if match or threshold is None: return match
+    return find_fuzzy(index, search, threshold)
@@ -0,0 +1,109 @@
+import os, sys, json, shlex, asyncio, subprocess
+from packaging.requirements import Requirement, InvalidRequirement
+from packaging.utils import canonicalize_name
+from src.utils.local.shell import run_shell_command
+
+# Dependencies of code_execution_env. Wheels are kept in a cache shared by every project (ai.code_execution.wheel_cache), and
+# the packages installed in a project's environment are pinned in its lockfile (name==version lines, usable with pip -r).
+# Requirements the lockfile already satisfies are not installed again; the rest are installed in one pip run from the cache
+# alone, and only what the cache lacks is downloaded or built into it. A recreated environment is restored from the lockfile,
+# which works offline as long as the cache holds the wheels.
+# Installed with the environment itself, so never pinned.
+BUNDLED = {"pip", "setuptools", "wheel"}
+# Copy of the lockfile the environment was last synced with.
+SYNCED_LOCK = "marcus-packages.lock"
+
+def command_line(arguments):
+    return subprocess.list2cmdline(arguments) if sys.platform == "win32" else shlex.join(arguments)
+
+class PackageCache():
+    def __init__(self, wheel_dir, lock_path, timeout=900):
+        self.wheel_dir = os.path.abspath(os.path.expanduser(wheel_dir))
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.lock = self.read_lock()
+        # Installs and restores run one at a time, so nobody sees the environment (or the lock) halfway through one.
+        self.__busy = asyncio.Lock()
+
+    def read_lock(self):
+        lock = {}
+        try:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    name, _, version = line.strip().partition("==")
+                    if name and version: lock[canonicalize_name(name)] = version
+        except OSError: pass
+        return lock
+
+    def write_lock(self, packages):
+        self.lock = {canonicalize_name(name): version for name, version in packages.items() if canonicalize_name(name) not in BUNDLED}
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        with open(self.lock_path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{name}=={version}\n" for name, version in sorted(self.lock.items())))
+
+    def satisfied(self, requirement):
+        # Whether the locked version meets a requirement. Extras, URLs and markers are left to pip.
+        try: parsed = Requirement(requirement)
+        except InvalidRequirement: return False
+        version = self.lock.get(canonicalize_name(parsed.name))
+        if version is None or parsed.extras or parsed.url or parsed.marker: return False
+        return parsed.specifier.contains(version, prereleases=True)
+
+    async def pip(self, python, *arguments):
+        return await run_shell_command(command_line([python, "-m", "pip", *arguments, "--disable-pip-version-check"]), self.timeout)
+
+    async def installed(self, python):
+        process = await asyncio.create_subprocess_exec(python, "-m", "pip", "list", "--format=json", "--disable-pip-version-check", stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        stdout, _ = await process.communicate()
+        try: return {package["name"]: package["version"] for package in json.loads(stdout)}
+        except (ValueError, KeyError, TypeError): return {}
+
+    async def install(self, python, requirements):
+        # Install requirements into the environment of python. Returns what was skipped and installed, and where from.
+        async with self.__busy: return await self.__install(python, requirements)
+
+    async def __install(self, python, requirements, check_lock=True):
+        requirements = [requirement.strip() for requirement in requirements if requirement and requirement.strip()]
+        pending = [requirement for requirement in requirements if not (check_lock and self.satisfied(requirement))]
+        result = {"already_installed": [requirement for requirement in requirements if requirement not in pending], "installed": [], "source": None}
+        if not pending: return result
+        os.makedirs(self.wheel_dir, exist_ok=True)
+        offline = ["install", "--no-index", "--find-links", self.wheel_dir, *pending]
+        run = await self.pip(python, *offline)
+        source = "wheel cache"
+        if run["return_code"] != 0:
+            # Fetch or build what the cache lacks (one resolver run for every requirement), then install from the cache.
+            run = await self.pip(python, "wheel", "--wheel-dir", self.wheel_dir, "--find-links", self.wheel_dir, *pending)
+            if run["return_code"] == 0: run = await self.pip(python, *offline)
+            source = "package index, now in the wheel cache"
+        if run["return_code"] != 0:
+            result["error"] = run.get("error") or "pip failed."
+            result["output"] = run["stderr"] or run["stdout"]
+            return result
+        self.write_lock(await self.installed(python))
+        self.mark_synced(python)
+        result["installed"] = pending
+        result["source"] = source
+        return result
+
+    def synced_path(self, python):
+        return os.path.join(os.path.dirname(os.path.dirname(python)), SYNCED_LOCK)
+
+    def mark_synced(self, python):
+        with open(self.synced_path(python), "w", encoding="utf-8") as f: f.write(json.dumps(self.lock, sort_keys=True))
+
+    async def restore(self, python):
+        # Bring a new or recreated environment in line with the lockfile. A no-op once they match.
+        async with self.__busy:
+            if not self.lock: return None
+            try:
+                with open(self.synced_path(python), "r", encoding="utf-8") as f:
+                    if json.loads(f.read()) == self.lock: return None
+            except (OSError, ValueError): pass
+            installed = {canonicalize_name(name): version for name, version in (await self.installed(python)).items()}
+            missing = [f"{name}=={version}" for name, version in self.lock.items() if installed.get(name) != version]
+            if not missing:
+                self.mark_synced(python)
+                return None
+            # Pins are checked against the environment here, not the lockfile.
+            return await self.__install(python, missing, check_lock=False)
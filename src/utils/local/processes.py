@@ -0,0 +1,116 @@
+import os, sys, time, signal, asyncio, subprocess
+
+# Registry of the background jobs of execute_code. Every job leads its own process group, so stopping it reaches everything it
+# started: SIGTERM first, SIGKILL once the grace period runs out. Resource usage (CPU time, CPU share since the previous sample
+# and resident memory of the whole group) is sampled from /proc on Linux and from ps on other POSIX systems.
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def parse_cputime(value):
+    # [dd-]hh:mm:ss or mm:ss.ss, as printed by ps.
+    days, _, value = value.rpartition("-")
+    seconds = 0.0
+    for part in value.split(":"): seconds = seconds * 60 + float(part)
+    return seconds + int(days or 0) * 86400
+
+def group_usage(pgid):
+    # (cpu_seconds, rss_bytes, processes) of a process group, or None where it cannot be measured.
+    if os.path.isdir("/proc"):
+        cpu, rss, count = 0, 0, 0
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit(): continue
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as f: stat = f.read().decode("utf-8", errors="replace")
+            except OSError: continue
+            # The command name may contain spaces, the fields after it do not.
+            fields = stat[stat.rfind(")") + 2:].split()
+            if int(fields[2]) != pgid: continue
+            cpu += int(fields[11]) + int(fields[12])
+            rss += int(fields[21]) * PAGE_BYTES
+            count += 1
+        return (cpu / CLOCK_TICKS, rss, count) if count else None
+    if sys.platform == "win32": return None
+    try: output = subprocess.run(["ps", "-A", "-o", "pgid=,rss=,time="], capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError): return None
+    cpu, rss, count = 0.0, 0, 0
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) != 3 or not fields[0].isdigit() or int(fields[0]) != pgid: continue
+        cpu += parse_cputime(fields[2])
+        rss += int(fields[1]) * 1024
+        count += 1
+    return (cpu, rss, count) if count else None
+
+class ProcessRegistry():
+    def __init__(self, grace_seconds=5):
+        self.grace_seconds = grace_seconds
+        self.jobs = {}
+        # Previous (time, cpu_seconds) of every job, for its CPU share.
+        self.__samples = {}
+
+    def __contains__(self, process_id):
+        return process_id in self.jobs
+
+    def __getitem__(self, process_id):
+        return self.jobs[process_id]
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def get(self, process_id, default=None):
+        return self.jobs.get(process_id, default)
+
+    def add(self, job):
+        self.jobs[job.id] = job
+
+    def remove(self, process_id):
+        self.__samples.pop(process_id, None)
+        return self.jobs.pop(process_id, None)
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.running]
+
+    async def stop(self, process_id):
+        # Stop a job and forget it. Returns what happened.
+        job = self.remove(process_id)
+        if job is None: return f"No running process found with ID {process_id}."
+        if not job.running: return f"Process {process_id} had already exited with return code {job.return_code}."
+        job.kill(signal.SIGTERM)
+        try: await asyncio.wait_for(asyncio.shield(job.done), self.grace_seconds)
+        except asyncio.TimeoutError:
+            job.kill(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+            try: await asyncio.wait_for(asyncio.shield(job.done), self.grace_seconds)
+            except asyncio.TimeoutError: return f"Process {process_id} did not exit after SIGKILL."
+            return f"Process {process_id} did not exit within {self.grace_seconds}s of SIGTERM and was killed."
+        return f"Process {process_id} has been stopped (return code {job.return_code})."
+
+    async def stop_all(self):
+        return await asyncio.gather(*(self.stop(job.id) for job in self.running()))
+
+    def kill_all(self):
+        # Last resort when the event loop is gone (atexit): kill every group that is still running.
+        for job in self.running(): job.kill(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+
+    def usage(self, job):
+        # Resource usage of a running job: {"cpu_seconds", "cpu_percent", "rss_bytes", "processes"}, or None.
+        if not job.running or job.pid is None: return None
+        measured = group_usage(job.pid)
+        if measured is None: return None
+        cpu, rss, count = measured
+        now = time.monotonic()
+        previous_time, previous_cpu = self.__samples.get(job.id, (job.created, 0.0))
+        self.__samples[job.id] = (now, cpu)
+        percent = (cpu - previous_cpu) / (now - previous_time) * 100 if now > previous_time else 0.0
+        return {"cpu_seconds": cpu, "cpu_percent": max(percent, 0.0), "rss_bytes": rss, "processes": count}
+
+    def describe(self, job):
+        # One line of status for the model and the user.
+        uptime = time.monotonic() - job.created
+        if not job.running: return f"{job.id}: exited with return code {job.return_code} after {uptime:.0f}s"
+        usage = self.usage(job)
+        if usage is None: return f"{job.id}: running for {uptime:.0f}s (pid {job.pid})"
+        return f"{job.id}: running for {uptime:.0f}s (pid {job.pid}, {usage["processes"]} process{"es" if usage["processes"] != 1 else ""}), CPU {usage["cpu_seconds"]:.1f}s ({usage["cpu_percent"]:.0f}%), memory {usage["rss_bytes"] / 1024 / 1024:.1f} MB"
+
+    def report(self):
+        if not self.jobs: return "No background processes."
+        return "\n".join(self.describe(job) for job in self.jobs.values())
@@ -0,0 +1,89 @@
+import os, sys, json, runpy, traceback
+
+# Warm interpreter of the execute_code worker pool (src/utils/local/sandbox.py). It is started once by the python of
+# code_execution_env and imports nothing from this project. Jobs arrive on stdin as JSON lines
+# ({"id", "script", "cwd", "cpu_seconds", "memory_bytes"}); every job runs in a forked child (a fresh process from the already
+# started interpreter) with its own session, resource limits and namespace, writing stdout and stderr to files next to its
+# script. Events go back on stdout as JSON lines: {"id", "event": "started", "pid"} and {"id", "event": "exited", "return_code"}.
+# Where fork is not available (Windows) every job is a fresh interpreter instead.
+
+def reply(event):
+    sys.stdout.write(json.dumps(event) + "\n")
+    sys.stdout.flush()
+
+def limit(cpu_seconds, memory_bytes):
+    try: import resource
+    except ImportError: return
+    for kind, value in ((resource.RLIMIT_CPU, cpu_seconds), (resource.RLIMIT_AS, memory_bytes)):
+        if not value: continue
+        try: resource.setrlimit(kind, (value, value))
+        except (ValueError, OSError): pass
+
+def output_files(job):
+    directory = os.path.dirname(job["script"])
+    return os.path.join(directory, "stdout"), os.path.join(directory, "stderr")
+
+def run_child(job):
+    # Runs in the forked child and never returns.
+    code = 1
+    try:
+        os.setsid()
+        limit(job.get("cpu_seconds"), job.get("memory_bytes"))
+        stdout, stderr = output_files(job)
+        for fd, path, flags in ((0, os.devnull, os.O_RDONLY), (1, stdout, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), (2, stderr, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+            target = os.open(path, flags)
+            os.dup2(target, fd)
+            os.close(target)
+        os.chdir(job["cwd"])
+        sys.argv = [job["script"]]
+        # Imports resolve against the working directory, as they did when the script was written there, not its temp directory.
+        sys.path[0] = job["cwd"]
+        try:
+            runpy.run_path(job["script"], run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None: code = 0
+            elif isinstance(e.code, int): code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException as e:
+            # Hide the runner's own frames from the traceback.
+            tb = e.__traceback__
+            while tb is not None and tb.tb_frame.f_code.co_filename != job["script"]: tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb or e.__traceback__)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally: os._exit(code)
+
+def run(job):
+    if hasattr(os, "fork"):
+        pid = os.fork()
+        if pid == 0: run_child(job)
+        reply({"id": job["id"], "event": "started", "pid": pid})
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+    import subprocess
+    stdout, stderr = output_files(job)
+    with open(stdout, "wb") as out, open(stderr, "wb") as err:
+        process = subprocess.Popen([sys.executable, job["script"]], stdin=subprocess.DEVNULL, stdout=out, stderr=err, cwd=job["cwd"], creationflags=getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0))
+        reply({"id": job["id"], "event": "started", "pid": process.pid})
+        return process.wait()
+
+def main():
+    # Modules imported once here are already loaded in every job.
+    for module in sys.argv[1:]:
+        try: __import__(module)
+        except Exception: pass
+    for line in sys.stdin:
+        if not line.strip(): continue
+        job = json.loads(line)
+        try: return_code = run(job)
+        except Exception as e:
+            reply({"id": job["id"], "event": "exited", "return_code": None, "error": str(e)})
+            continue
+        reply({"id": job["id"], "event": "exited", "return_code": return_code})
+
+if __name__ == "__main__": main()
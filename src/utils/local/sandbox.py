@@ -0,0 +1,221 @@
+import os, sys, json, time, signal, shutil, asyncio, tempfile, itertools
+
+# Pool of warm interpreters for execute_code. Every worker is the python of code_execution_env running runner.py, started once
+# and reused: a job costs a fork instead of a shell, a venv activation and an interpreter start-up. Jobs run in their own
+# session with CPU and memory limits, and their script and output live in a temporary directory instead of the working directory.
+# Output is drained from there into bounded ring buffers, so a chatty background job costs a fixed amount of memory and can be
+# read back incrementally by byte offset.
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runner.py")
+
+def venv_python(venv_path):
+    if sys.platform == "win32": return os.path.join(venv_path, "Scripts", "python.exe")
+    return os.path.join(venv_path, "bin", "python")
+
+class OutputBuffer():
+    # The last max_bytes of a stream. Offsets count every byte the stream ever produced.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+        self.start = 0
+
+    @property
+    def end(self):
+        return self.start + len(self.data)
+
+    def append(self, chunk):
+        self.data += chunk
+        overflow = len(self.data) - self.max_bytes
+        if overflow > 0:
+            del self.data[:overflow]
+            self.start += overflow
+
+    def read(self, offset=0):
+        # Text from offset to the end, and how many bytes before it were already dropped.
+        skipped = max(self.start - offset, 0)
+        return self.data[max(offset - self.start, 0):].decode("utf-8", errors="replace"), skipped
+
+    def text(self):
+        text, _ = self.read(0)
+        return f"[{self.start:,} earlier bytes dropped]\n{text}" if self.start else text
+
+class Job():
+    # Bytes read from the output files in one go.
+    CHUNK_BYTES = 1024 * 1024
+
+    def __init__(self, id, code, buffer_bytes=64 * 1024):
+        self.id = id
+        self.directory = tempfile.mkdtemp(prefix=f"marcus-{id}-")
+        self.script = os.path.join(self.directory, "main.py")
+        with open(self.script, "w", encoding="utf-8") as f:
+            f.write(code)
+        self.pid = None
+        self.created = time.monotonic()
+        self.streams = {"stdout": OutputBuffer(buffer_bytes), "stderr": OutputBuffer(buffer_bytes)}
+        # Where the previous read_process_output call stopped, per stream.
+        self.cursors = {"stdout": 0, "stderr": 0}
+        self.__positions = {"stdout": 0, "stderr": 0}
+        self.return_code = None
+        self.error = None
+        # Task draining the output of a background job (see follow).
+        self.follower = None
+        loop = asyncio.get_running_loop()
+        self.started = loop.create_future()
+        self.done = loop.create_future()
+
+    @property
+    def running(self):
+        return not self.done.done()
+
+    def finish(self, return_code, error=None):
+        self.return_code = return_code
+        self.error = error
+        if not self.started.done(): self.started.set_result(None)
+        if not self.done.done(): self.done.set_result(return_code)
+
+    def drain(self):
+        # Move the output written since the last drain into the ring buffers.
+        for name, buffer in self.streams.items():
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    f.seek(self.__positions[name])
+                    while chunk := f.read(self.CHUNK_BYTES): buffer.append(chunk)
+                    self.__positions[name] = f.tell()
+            except OSError: pass
+
+    async def follow(self, interval=0.25):
+        # Drain the output of a background job until it exits, then remove its files.
+        while self.running:
+            self.drain()
+            await asyncio.wait([self.done], timeout=interval)
+        self.drain()
+        self.cleanup()
+
+    def output(self):
+        self.drain()
+        return self.streams["stdout"].text(), self.streams["stderr"].text() + (f"\n{self.error}" if self.error else "")
+
+    def kill(self, signum=signal.SIGTERM):
+        # The job leads its own session, so its children get the signal too.
+        if self.pid is None or not self.running: return False
+        try:
+            if sys.platform == "win32": os.kill(self.pid, signum)
+            else: os.killpg(self.pid, signum)
+        except (ProcessLookupError, PermissionError): return False
+        return True
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+class Worker():
+    def __init__(self, process, on_idle, generation=0):
+        self.process = process
+        self.job = None
+        # Pool generation the interpreter was started in (see WorkerPool.recycle).
+        self.generation = generation
+        self.__on_idle = on_idle
+        self.__reader = asyncio.create_task(self.__read())
+
+    async def __read(self):
+        async for line in self.process.stdout:
+            try: event = json.loads(line)
+            except ValueError: continue
+            job = self.job
+            if job is None or event.get("id") != job.id: continue
+            if event["event"] == "started":
+                job.pid = event["pid"]
+                if not job.started.done(): job.started.set_result(job.pid)
+            elif event["event"] == "exited":
+                self.job = None
+                job.finish(event.get("return_code"), event.get("error"))
+                self.__on_idle(self)
+        # The interpreter went away: fail its job.
+        if self.job is not None: self.job.finish(None, "The execution worker exited unexpectedly.")
+        self.job = None
+
+    @property
+    def alive(self):
+        return self.process.returncode is None and not self.__reader.done()
+
+    def submit(self, job, limits):
+        self.job = job
+        self.process.stdin.write((json.dumps({"id": job.id, "script": job.script, "cwd": os.getcwd(), **limits}) + "\n").encode("utf-8"))
+
+    async def close(self):
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            try: await asyncio.wait_for(self.process.wait(), 2)
+            except asyncio.TimeoutError: self.process.kill()
+        self.__reader.cancel()
+
+class WorkerPool():
+    def __init__(self, size=2, cpu_seconds=None, memory_mb=None, preload=(), buffer_bytes=64 * 1024):
+        self.size = size
+        self.buffer_bytes = buffer_bytes
+        self.limits = {"cpu_seconds": cpu_seconds, "memory_bytes": memory_mb * 1024 * 1024 if memory_mb else None}
+        self.preload = list(preload)
+        self.python = None
+        self.idle = []
+        self.busy = set()
+        # Bumped by recycle: workers of an older generation are retired instead of reused.
+        self.generation = 0
+        self.__ids = itertools.count(1)
+        self.__spawning = set()
+        self.__lock = asyncio.Lock()
+
+    def current(self, worker):
+        return worker.alive and worker.generation == self.generation
+
+    async def spawn(self):
+        generation = self.generation
+        process = await asyncio.create_subprocess_exec(self.python, "-u", RUNNER, *self.preload, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        self.idle.append(Worker(process, self.release, generation))
+
+    async def start(self, python):
+        # Bring the pool up to size, (re)starting it if the interpreter changed.
+        async with self.__lock:
+            if python != self.python:
+                await self.close()
+                self.python = python
+            for worker in [worker for worker in self.idle if not self.current(worker)]:
+                self.idle.remove(worker)
+                asyncio.create_task(worker.close())
+            if len(self.idle) < self.size: await asyncio.gather(*(self.spawn() for _ in range(self.size - len(self.idle))))
+
+    def release(self, worker):
+        self.busy.discard(worker)
+        if self.current(worker) and len(self.idle) < self.size: self.idle.append(worker)
+        else: asyncio.create_task(worker.close())
+
+    def refill(self):
+        # Keep a warm worker ready while long jobs hold the others.
+        if self.idle or self.__spawning: return
+        task = asyncio.create_task(self.spawn())
+        self.__spawning.add(task)
+        task.add_done_callback(self.__spawning.discard)
+
+    async def run(self, code, python):
+        # Start code on a warm worker. Returns the Job once its process has started.
+        await self.start(python)
+        worker = self.idle.pop()
+        self.busy.add(worker)
+        self.refill()
+        job = Job(f"process_{next(self.__ids)}", code, self.buffer_bytes)
+        worker.submit(job, self.limits)
+        await worker.process.stdin.drain()
+        await job.started
+        return job
+
+    async def recycle(self):
+        # Replace the workers, e.g. after packages were installed, so the next jobs see them: idle ones now, busy ones (and any
+        # being spawned) once their job is done.
+        self.generation += 1
+        idle, self.idle = self.idle, []
+        await asyncio.gather(*(worker.close() for worker in idle), return_exceptions=True)
+
+    async def close(self):
+        for worker in list(self.busy):
+            if worker.job is not None: worker.job.kill(signal.SIGKILL if hasattr(signal, "SIGKILL") else signal.SIGTERM)
+        await asyncio.gather(*self.__spawning, return_exceptions=True)
+        await asyncio.gather(*(worker.close() for worker in self.idle + list(self.busy)), return_exceptions=True)
+        self.idle = []
+        self.busy = set()
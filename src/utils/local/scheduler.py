@@ -0,0 +1,43 @@
+import os, time, asyncio
+import src.lib.globals as globals
+from contextlib import AsyncExitStack
+from src.utils.telemetry import span
+from src.utils.local.terminal import execute_tool
+
+# Tools with side effects outside the paths in their input share a single lock. Shell commands run in parallel instead, bounded
+# by ai.shell.max_parallel (src/utils/local/shell.py).
+SHELL_TOOLS = {"execute_code", "stop_process", "install_packages"}
+SHELL_LOCK = "<shell>"
+# Tools that may change files under the project, after which the project index must be refreshed before its next query.
+WRITING_TOOLS = SHELL_TOOLS | {"create_files", "edit_and_apply_multiple", "create_folders", "scan_folder", "run_shell_command"}
+
+def input_paths(value):
+    if isinstance(value, str): return [value]
+    if isinstance(value, dict): return [value["path"]] if isinstance(value.get("path"), str) else []
+    if isinstance(value, list): return [path for item in value for path in input_paths(item)]
+    return []
+
+def lock_keys(tool_name, tool_input):
+    # Paths a tool reads or writes. Tools sharing a key never run at the same time.
+    if not isinstance(tool_input, dict): return set()
+    if tool_name in SHELL_TOOLS: return {SHELL_LOCK}
+    if tool_name in ("create_files", "edit_and_apply_multiple"): paths = input_paths(tool_input.get("files"))
+    elif tool_name in ("create_folders", "read_multiple_files"): paths = input_paths(tool_input.get("paths"))
+    elif tool_name == "scan_folder": paths = input_paths(tool_input.get("output_file"))
+    else: paths = []
+    return {os.path.abspath(path) for path in paths}
+
+async def run_tools(provider, tool_calls):
+    # Run the (tool_name, tool_input) calls of one turn concurrently, serializing calls that touch the same path. Results keep the call order.
+    locks = {}
+    async def run(tool_name, tool_input):
+        queued = time.perf_counter()
+        async with AsyncExitStack() as stack:
+            # Sorted acquisition keeps calls with overlapping keys from deadlocking.
+            for key in sorted(lock_keys(tool_name, tool_input)): await stack.enter_async_context(locks.setdefault(key, asyncio.Lock()))
+            with span(tool_name, "tool", waited=round(time.perf_counter() - queued, 6)) as tool_span:
+                result = await execute_tool(provider, tool_name, tool_input)
+                if tool_name in WRITING_TOOLS: globals.project_index.mark_stale()
+                tool_span.args["is_error"] = result.get("is_error", False)
+                return result
+    return await asyncio.gather(*(run(tool_name, tool_input) for tool_name, tool_input in tool_calls))
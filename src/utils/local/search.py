@@ -0,0 +1,54 @@
+import os, re, math, sqlite3
+from collections import Counter
+
+# Ranked code search over the project index. Every text file is cut into chunks of CHUNK_LINES lines, and every chunk is
+# indexed by its identifier terms (lowercased, plus their camelCase and snake_case parts, so "file store" finds FileStore).
+# Queries are ranked with BM25 and answered with the matching lines, so the model reads a few relevant lines instead of a whole file.
+CHUNK_LINES = 20
+MAX_SNIPPETS = 8
+# BM25 term-frequency saturation and length normalization.
+K1 = 1.2
+B = 0.75
+WORDS = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+PARTS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+def terms(text):
+    found = []
+    for word in WORDS.findall(text):
+        found.append(word.lower())
+        # Leading and trailing underscores (_private, __dunder__) are not part of the name.
+        stripped = word.strip("_")
+        if stripped and stripped != word: found.append(stripped.lower())
+        parts = PARTS.findall(stripped)
+        if len(parts) > 1: found += [part.lower() for part in parts]
+    return found
+
+def chunk_terms(text):
+    # [(first line, last line, term counts)] of the non-empty chunks of a file. Lines are 1-based.
+    lines = text.splitlines()
+    chunks = []
+    for start in range(0, len(lines), CHUNK_LINES):
+        counts = Counter(terms("\n".join(lines[start:start + CHUNK_LINES])))
+        if counts: chunks.append((start + 1, min(start + CHUNK_LINES, len(lines)), counts))
+    return chunks
+
+def bm25(tf, length, df, chunks, average_length):
+    idf = math.log(1 + (chunks - df + 0.5) / (df + 0.5))
+    return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+
+def snippet(path, start, end):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()[start - 1:end]
+    return "\n".join(f"{number:>5} | {line}" for number, line in enumerate(lines, start))
+
+def search_code(index, query, path=None, language=None, limit=MAX_SNIPPETS):
+    try:
+        index.refresh()
+        results = index.search(terms(query), path, language, limit)
+    except sqlite3.Error as e: return f"Error searching the project index: {str(e)}"
+    if not results: return f"No code matches '{query}'."
+    sections = []
+    for relative, start, end, score in results:
+        try: sections.append(f"{relative}:{start}-{end} (score {score:.2f})\n{snippet(os.path.join(index.root, relative), start, end)}")
+        except OSError: continue
+    return "\n\n".join(sections)
@@ -0,0 +1,111 @@
+import os, sys, codecs, signal, asyncio
+from src.lib.config import config
+from src.utils.basics import console
+from src.utils.local.sandbox import OutputBuffer
+
+# Shell commands of the run_shell_command tool. They run without blocking the event loop, in their own process group so a
+# timeout stops everything they started, and at most ai.shell.max_parallel at a time. Only the first head_bytes and last
+# tail_bytes of their output are kept for the tool result, and only those are echoed to the console.
+CHUNK_BYTES = 64 * 1024
+# Wait for the pipes to close once the command exited (processes it left in the background may keep them open).
+DRAIN_SECONDS = 1
+
+semaphore = asyncio.Semaphore(config.ai.shell.max_parallel)
+
+class HeadTail():
+    def __init__(self, head_bytes, tail_bytes):
+        self.head_bytes = head_bytes
+        self.head = bytearray()
+        self.tail = OutputBuffer(tail_bytes)
+
+    def append(self, chunk):
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk: self.tail.append(chunk)
+
+    def text(self):
+        head = self.head.decode("utf-8", errors="replace")
+        tail, _ = self.tail.read(self.tail.start)
+        if self.tail.start: return f"{head}\n[... {self.tail.start:,} bytes omitted ...]\n{tail}"
+        return head + tail
+
+async def pump(stream, capture, prefix, echo):
+    # Read a pipe to the end, keeping its head and tail. Complete lines of the head are echoed as they arrive, the tail once the
+    # pipe closes: printing everything in between would hold up the event loop (and the timeout) for seconds.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    echoed = 0
+    def show(text): console.print("\n".join(f"{prefix}{line}" for line in text.split("\n")), style="dim", markup=False, highlight=False)
+    while chunk := await stream.read(CHUNK_BYTES):
+        capture.append(chunk)
+        if not echo or echoed >= capture.head_bytes: continue
+        chunk = chunk[:capture.head_bytes - echoed]
+        echoed += len(chunk)
+        pending += decoder.decode(chunk, final=echoed >= capture.head_bytes)
+        text, _, pending = pending.rpartition("\n")
+        if echoed >= capture.head_bytes: text, pending = f"{text}\n{pending}" if text else pending, ""
+        if text: show(text)
+    pending += decoder.decode(b"", final=True)
+    if echo and pending: show(pending)
+    if echo and capture.tail.end:
+        tail, _ = capture.tail.read(capture.tail.start)
+        console.print(f"{prefix}[... {capture.tail.start:,} bytes not echoed ...]", style="dim", markup=False, highlight=False)
+        show(tail.removesuffix("\n"))
+
+async def open_pipe():
+    # A pipe read through the event loop. asyncio's own subprocess pipes make process.wait() also wait for them to close, which
+    # processes left in the background by the command can postpone indefinitely; a plain descriptor does not. Returns
+    # (reader, transport, write_fd), or Nones where the loop cannot read plain pipes (Windows).
+    if sys.platform == "win32": return None, None, asyncio.subprocess.PIPE
+    read_fd, write_fd = os.pipe()
+    reader = asyncio.StreamReader(limit=CHUNK_BYTES)
+    transport, _ = await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb", 0))
+    return reader, transport, write_fd
+
+def kill(process):
+    try:
+        if sys.platform == "win32": process.kill()
+        else: os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError: pass
+
+async def run_shell_command(command, timeout=None):
+    shell = config.ai.shell
+    timeout = timeout or shell.timeout
+    async with semaphore:
+        console.print(f"$ {command}", style="bold", markup=False, highlight=False)
+        pipes = [await open_pipe(), await open_pipe()]
+        try: process = await asyncio.create_subprocess_shell(command, stdin=asyncio.subprocess.DEVNULL, stdout=pipes[0][2], stderr=pipes[1][2], start_new_session=sys.platform != "win32")
+        except OSError as e:
+            for _, transport, _ in pipes:
+                if transport is not None: transport.close()
+            return {"error": f"An error occurred while executing the command: {str(e)}"}
+        finally:
+            # The command holds the write ends now.
+            for _, _, write_fd in pipes:
+                if isinstance(write_fd, int) and write_fd >= 0: os.close(write_fd)
+        readers = [reader or stream for (reader, _, _), stream in zip(pipes, (process.stdout, process.stderr))]
+        stdout, stderr = HeadTail(shell.head_bytes, shell.tail_bytes), HeadTail(shell.head_bytes, shell.tail_bytes)
+        pumps = asyncio.gather(pump(readers[0], stdout, "", shell.echo), pump(readers[1], stderr, "! ", shell.echo))
+        timed_out = False
+        try: await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill(process)
+            await process.wait()
+        except asyncio.CancelledError:
+            kill(process)
+            raise
+        try: await asyncio.wait_for(pumps, DRAIN_SECONDS)
+        except asyncio.TimeoutError: pass
+        for _, transport, _ in pipes:
+            if transport is not None: transport.close()
+    result = {
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "return_code": process.returncode
+    }
+    if timed_out: result["error"] = f"The command did not finish within {timeout} seconds and was killed."
+    elif process.returncode != 0: result["error"] = f"Command '{command}' returned non-zero exit status {process.returncode}."
+    return result
@@ -0,0 +1,178 @@
+import os, hashlib, threading
+from collections import OrderedDict
+
+# File contents that are part of the main model's context, keyed by absolute path.
+# Every entry remembers the mtime, size and hash of the copy it holds, so a file changed on disk is re-read lazily the next
+# time it is looked up instead of being served stale. The store is bounded by max_bytes: once it is over budget, the least
+# recently referenced files are evicted first. Listing the store (to build the prompt) validates entries but is not a reference.
+# Tools update the store from worker threads while the event loop builds prompts from it, so every public method holds a lock.
+
+def digest(content):
+    return hashlib.blake2b(content.encode("utf-8", errors="surrogatepass"), digest_size=16).hexdigest()
+
+class FileEntry():
+    __slots__ = ("content", "mtime", "size", "hash")
+
+    def __init__(self, content, mtime=None, size=None):
+        self.content = content
+        self.mtime = mtime
+        self.size = size
+        self.hash = digest(content)
+
+class FileStore():
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.evicted = []
+        self.__lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.__lock:
+            # Least recently referenced first.
+            self.__entries = OrderedDict()
+            self.total_bytes = 0
+
+    @staticmethod
+    def key(path):
+        return os.path.abspath(path)
+
+    def __stat(self, path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError: return None, None
+
+    def __put(self, path, entry):
+        previous = self.__entries.pop(path, None)
+        if previous is not None: self.total_bytes -= len(previous.content)
+        self.__entries[path] = entry
+        self.total_bytes += len(entry.content)
+
+    def __validate(self, path):
+        # Entry for path, re-read from disk if the file changed since it was stored. Files deleted from disk leave the store.
+        entry = self.__entries.get(path)
+        if entry is None: return None
+        mtime, size = self.__stat(path)
+        if mtime is None:
+            if entry.mtime is None: return entry
+            self.__drop(path)
+            return None
+        if (mtime, size) == (entry.mtime, entry.size): return entry
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            self.__drop(path)
+            return None
+        if digest(content) == entry.hash:
+            # Touched but not changed: keep the same string so the prompt sections are not re-rendered.
+            entry.mtime, entry.size = mtime, size
+            return entry
+        refreshed = FileEntry(content, mtime, size)
+        self.total_bytes += len(content) - len(entry.content)
+        self.__entries[path] = refreshed
+        return refreshed
+
+    def __drop(self, path):
+        entry = self.__entries.pop(path, None)
+        if entry is not None: self.total_bytes -= len(entry.content)
+
+    def __evict(self, keep):
+        while self.max_bytes and self.total_bytes > self.max_bytes and len(self.__entries) > 1:
+            path = next(iter(self.__entries))
+            if path == keep: break
+            self.__drop(path)
+            self.evicted.append(path)
+
+    def take_evicted(self):
+        # Paths evicted since the previous call.
+        with self.__lock:
+            evicted, self.evicted = self.evicted, []
+            return evicted
+
+    def touch(self, path):
+        path = self.key(path)
+        with self.__lock:
+            if path in self.__entries: self.__entries.move_to_end(path)
+
+    def is_fresh(self, path):
+        # True when path is stored and the stored copy matches the file on disk.
+        path = self.key(path)
+        with self.__lock:
+            entry = self.__entries.get(path)
+            if entry is None: return False
+            return self.__stat(path) == (entry.mtime, entry.size)
+
+    def load(self, path):
+        with self.__lock: return self.__load(self.key(path))
+
+    def __load(self, path):
+        # Read path from disk into the store as its most recently referenced file. Returns "read", "refreshed" or "cached".
+        entry = self.__entries.get(path)
+        status = "cached"
+        if entry is None:
+            mtime, size = self.__stat(path)
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            self.__put(path, FileEntry(content, mtime, size))
+            status = "read"
+        else:
+            validated = self.__validate(path)
+            if validated is None: return self.__load(path)
+            if validated is not entry: status = "refreshed"
+            self.__entries.move_to_end(path)
+        self.__evict(path)
+        return status
+
+    def __setitem__(self, path, content):
+        # Content just written to (or edited for) path. The disk state is recorded so the entry is not re-read needlessly.
+        path = self.key(path)
+        with self.__lock:
+            entry = self.__entries.get(path)
+            if entry is not None and entry.content == content:
+                entry.mtime, entry.size = self.__stat(path)
+                self.__entries.move_to_end(path)
+            else: self.__put(path, FileEntry(content, *self.__stat(path)))
+            self.__evict(path)
+
+    def __getitem__(self, path):
+        path = self.key(path)
+        with self.__lock:
+            entry = self.__validate(path)
+            if entry is None: raise KeyError(path)
+            self.__entries.move_to_end(path)
+            return entry.content
+
+    def get(self, path, default=None):
+        try: return self[path]
+        except KeyError: return default
+
+    def __contains__(self, path):
+        with self.__lock: return self.__validate(self.key(path)) is not None
+
+    def __delitem__(self, path):
+        path = self.key(path)
+        with self.__lock:
+            if path not in self.__entries: raise KeyError(path)
+            self.__drop(path)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __bool__(self):
+        return bool(self.__entries)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [path for path, _ in self.items()]
+
+    def items(self):
+        # Validated (path, content) pairs. Listing is not a reference, so it leaves the eviction order untouched.
+        items = []
+        with self.__lock:
+            for path in list(self.__entries):
+                entry = self.__validate(path)
+                if entry is not None: items.append((path, entry.content))
+        return items
@@ -1,12 +1,18 @@
 import src.lib.globals as globals
+from src.lib.config import config
 from typing import Tuple, Dict, Any
-import os, sys, json, venv, tavily, asyncio, subprocess
+import os, sys, json, venv, tavily, asyncio
+from src.utils.telemetry import span
 from src.utils.basics import logging, console, terminal
 from src.utils.local.worker import edit_and_apply_multiple
+from src.utils.local.index import query_index
+from src.utils.local.search import search_code
+from src.utils.local.sandbox import venv_python
+from src.utils.local.shell import run_shell_command
 from src.utils.local.files import create_files, read_multiple_files
 from src.utils.local.folders import create_folders, list_files, scan_folder, validate_files_structure
 
-async def send_to_ai_for_executing(client, code, execution_result):
+async def send_to_ai_for_executing(provider, code, execution_result):
     try:
         system_prompt = f"""
         You are an AI code execution agent. Your task is to analyze the provided code and its execution result from the 'code_execution_env' virtual environment, then provide a concise summary of what worked, what didn't work, and any important observations. Follow these steps:
@@ -28,48 +34,12 @@ async def send_to_ai_for_executing(client, code, execution_result):
 
         IMPORTANT: PROVIDE ONLY YOUR ANALYSIS AND OBSERVATIONS. DO NOT INCLUDE ANY PREFACING STATEMENTS OR EXPLANATIONS OF YOUR ROLE.
         """
-        response = client.beta.prompt_caching.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=2000,
-            system=[
-                {
-                    "type": "text",
-                    "text": system_prompt,
-                    "cache_control": {"type": "ephemeral"}
-                }
-            ],
-            messages=[
-                {"role": "user", "content": f"Analyze this code execution from the 'code_execution_env' virtual environment:\n\nCode:\n{code}\n\nExecution Result:\n{execution_result}"}
-            ],
-            extra_headers={"anthropic-beta": "prompt-caching-2024-07-31"}
-        )
-        # Update token usage for code execution.
-        globals.code_execution_tokens["input"] += response.usage.input_tokens
-        globals.code_execution_tokens["output"] += response.usage.output_tokens
-        globals.code_execution_tokens["cache_creation"] = response.usage.cache_creation_input_tokens
-        globals.code_execution_tokens["cache_read"] = response.usage.cache_read_input_tokens
-        return response.content[0].text
+        prompt = f"Analyze this code execution from the 'code_execution_env' virtual environment:\n\nCode:\n{code}\n\nExecution Result:\n{execution_result}"
+        with span("code_execution_model", "model"): return await provider.complete("code_execution_model", system_prompt, prompt, max_tokens=2000, cached=True)
     except Exception as e:
         console.print(f"Error in AI code execution analysis: {str(e)}", style="bold red")
         return f"Error analyzing code execution from 'code_execution_env': {str(e)}"
 
-def run_shell_command(command):
-    try:
-        result = subprocess.run(command, shell=True, check=True, text=True, capture_output=True)
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "return_code": result.returncode
-        }
-    except subprocess.CalledProcessError as e:
-        return {
-            "stdout": e.stdout,
-            "stderr": e.stderr,
-            "return_code": e.returncode,
-            "error": str(e)
-        }
-    except Exception as e: return { "error": f"An error occurred while executing the command: {str(e)}" }
-
 def setup_virtual_environment() -> Tuple[str, str]:
     venv_name = "code_execution_env"
     venv_path = os.path.join(os.getcwd(), venv_name)
@@ -83,11 +53,34 @@ def setup_virtual_environment() -> Tuple[str, str]:
         logging.error(f"Error setting up virtual environment: {str(e)}")
         raise
 
+# The startup warm-up and the first execute_code can both find code_execution_env missing: only one of them creates it.
+environment_lock = asyncio.Lock()
+
+async def code_python():
+    # Interpreter of code_execution_env, which runs the execute_code workers, with the locked packages installed.
+    async with environment_lock:
+        venv_path, _ = await asyncio.to_thread(setup_virtual_environment)
+        python = venv_python(venv_path)
+        restored = await globals.packages.restore(python)
+    if restored and restored.get("error"): logging.error(f"Error restoring the locked packages: {restored["error"]}")
+    return python
+
+async def install_packages(packages):
+    if isinstance(packages, str): packages = packages.split()
+    result = await globals.packages.install(await code_python(), packages)
+    if result["installed"]: await globals.code_workers.recycle()
+    return result
+
+async def start_code_workers():
+    try: await globals.code_workers.start(await code_python())
+    except Exception as e: logging.error(f"Error starting the code execution workers: {str(e)}")
+
 def tavily_search(query):
     try: return tavily.qna_search(query=query, search_depth="advanced")
     except Exception as e: return f"Error performing search: {str(e)}"
 
-async def execute_tool(client, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+async def execute_tool(provider, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+    # Blocking tools run in worker threads so several tools of one turn can run concurrently.
     try:
         result = None
         is_error = False
@@ -95,7 +88,7 @@ async def execute_tool(client, tool_name: str, tool_input: Dict[str, Any]) -> Di
         if tool_name == "create_files":
             if isinstance(tool_input, dict) and "files" in tool_input: files = tool_input["files"]
             else: files = tool_input
-            result = create_files(files)
+            result = await asyncio.to_thread(create_files, files)
         elif tool_name == "edit_and_apply_multiple":
             files = tool_input.get("files")
             if not files:
@@ -129,31 +122,35 @@ async def execute_tool(client, tool_name: str, tool_input: Dict[str, Any]) -> Di
                     except ValueError as ve:
                         result = f"Error: {str(ve)}"
                         is_error = True
-            if not is_error: result, console_output = await edit_and_apply_multiple(files, tool_input["project_context"], is_automode=globals.automode)
-        elif tool_name == "create_folders": result = create_folders(tool_input["paths"])
+            if not is_error: result, console_output = await edit_and_apply_multiple(provider, files, tool_input["project_context"], is_automode=globals.automode)
+        elif tool_name == "create_folders": result = await asyncio.to_thread(create_folders, tool_input["paths"])
         elif tool_name == "read_multiple_files":
             paths = tool_input.get("paths")
             recursive = tool_input.get("recursive", False)
             if paths is None:
                 result = "Error: No file paths provided"
                 is_error = True
-            else:
-                files_to_read = [p for p in (paths if isinstance(paths, list) else [paths]) if p not in globals.file_contents]
-                if not files_to_read: result = "All requested files are already in the system prompt. No need to read from disk."
-                else: result = read_multiple_files(files_to_read, recursive)
-        elif tool_name == "list_files": result = list_files(tool_input.get("path", "."))
-        elif tool_name == "tavily_search": result = tavily_search(tool_input["query"])
-        elif tool_name == "stop_process": result = stop_process(tool_input["process_id"])
+            else: result = await asyncio.to_thread(read_multiple_files, paths, recursive)
+        elif tool_name == "list_files": result = await asyncio.to_thread(list_files, tool_input.get("path", "."))
+        elif tool_name == "tavily_search": result = await asyncio.to_thread(tavily_search, tool_input["query"])
+        elif tool_name == "stop_process": result = await stop_process(tool_input["process_id"])
+        elif tool_name == "list_processes": result = list_processes()
+        elif tool_name == "read_process_output": result = read_process_output(tool_input["process_id"], tool_input.get("stdout_offset"), tool_input.get("stderr_offset"))
         elif tool_name == "execute_code":
             process_id, execution_result = await execute_code(tool_input["code"])
-            if execution_result.startswith("Process started and running"): analysis = "The process is still running in the background."
+            if "Return Code: Running" in execution_result: analysis = "The process is still running in the background."
             else:
-                analysis_task = asyncio.create_task(send_to_ai_for_executing(client, tool_input["code"], execution_result))
+                analysis_task = asyncio.create_task(send_to_ai_for_executing(provider, tool_input["code"], execution_result))
                 analysis = await analysis_task
             result = f"{execution_result}\n\nAnalysis:\n{analysis}"
-            if process_id in globals.running_processes: result += "\n\nNote: The process is still running in the background."
-        elif tool_name == "scan_folder": result = scan_folder(tool_input["folder_path"], tool_input["output_file"])
-        elif tool_name == "run_shell_command": result = run_shell_command(tool_input["command"])
+            if process_id in globals.running_processes and globals.running_processes[process_id].running: result += "\n\nNote: The process is still running in the background."
+        elif tool_name == "scan_folder": result = await asyncio.to_thread(scan_folder, tool_input["folder_path"], tool_input["output_file"])
+        elif tool_name == "install_packages":
+            result = await install_packages(tool_input["packages"])
+            is_error = "error" in result
+        elif tool_name == "run_shell_command": result = await run_shell_command(tool_input["command"], tool_input.get("timeout"))
+        elif tool_name == "query_index": result = await asyncio.to_thread(query_index, globals.project_index, tool_input.get("symbol"), tool_input.get("path"), tool_input.get("language"), tool_input.get("kind"))
+        elif tool_name == "search_code": result = await asyncio.to_thread(search_code, globals.project_index, tool_input["query"], tool_input.get("path"), tool_input.get("language"))
         else:
             is_error = True
             result = f"Unknown tool: {tool_name}"
@@ -177,50 +174,48 @@ async def execute_tool(client, tool_name: str, tool_input: Dict[str, Any]) -> Di
             "console_output": None
         }
     
-def stop_process(process_id):
-    global running_processes
-    if process_id in running_processes:
-        process = running_processes[process_id]
-        if sys.platform == "win32": process.terminate()
-        else: os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-        del running_processes[process_id]
-        return f"Process {process_id} has been stopped."
-    else: return f"No running process found with ID {process_id}."
-
-async def execute_code(code, timeout=10):
-    global running_processes
-    venv_path, activate_script = setup_virtual_environment()
+async def stop_process(process_id):
+    return await globals.running_processes.stop(process_id)
+
+def list_processes():
+    return globals.running_processes.report()
+
+def read_process_output(process_id, stdout_offset=None, stderr_offset=None):
+    # Output of a background process since the given byte offsets, or since the previous read.
+    job = globals.running_processes.get(process_id)
+    if job is None: return f"No process found with ID {process_id}."
+    job.drain()
+    parts = [f"Process ID: {process_id}", f"Status: {globals.running_processes.describe(job)}"]
+    for name, offset in (("stdout", stdout_offset), ("stderr", stderr_offset)):
+        buffer = job.streams[name]
+        offset = min(job.cursors[name] if offset is None else max(offset, 0), buffer.end)
+        text, skipped = buffer.read(offset)
+        start = offset + skipped
+        parts.append(f"{name.capitalize()} (bytes {start:,} to {buffer.end:,}{f", {skipped:,} earlier bytes no longer kept" if skipped else ""}):\n{text}")
+        job.cursors[name] = buffer.end
+    parts.append(f"Next offsets: stdout_offset={job.cursors["stdout"]}, stderr_offset={job.cursors["stderr"]}")
+    return "\n\n".join(parts)
+
+async def execute_code(code, timeout=config.ai.code_execution.timeout):
     # Input validation.
     if not isinstance(code, str): terminal("e", "code must be a string", exitScript=True)
     if not isinstance(timeout, (int, float)): terminal("e", "timeout must be a number", exitScript=True)
-    # Generate a unique identifier for this process.
-    process_id = f"process_{len(running_processes)}"
-    # Write the code to a temporary file.
-    try:
-        with open(f"{process_id}.py", "w") as f:
-            f.write(code)
-    except IOError as e: return process_id, f"Error writing code to file: {str(e)}"
-    # Prepare the command to run the code.
-    if sys.platform == "win32": command = f'"{activate_script}" && python3 {process_id}.py'
-    else: command = f'source "{activate_script}" && python3 {process_id}.py'
+    try: job = await globals.code_workers.run(code, await code_python())
+    except OSError as e: return None, f"Error executing code: {str(e)}"
     try:
-        # Create a process to run the command.
-        process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, shell=True, preexec_fn=None if sys.platform == "win32" else os.setsid)
-        # Store the process in our global dictionary.
-        running_processes[process_id] = process
-        try:
-            # Wait for initial output or timeout.
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
-            stdout = stdout.decode()
-            stderr = stderr.decode()
-            return_code = process.returncode
-        except asyncio.TimeoutError:
-            # If we timeout, it means the process is still running.
-            stdout = "Process started and running in the background."
-            stderr = ""
-            return_code = "Running"
-        return process_id, f"Process ID: {process_id}\n\nStdout:\n{stdout}\n\nStderr:\n{stderr}\n\nReturn Code: {return_code}"
-    except Exception as e: return process_id, f"Error executing code: {str(e)}"
-    finally:
-        try: os.remove(f"{process_id}.py")
-        except OSError: pass
\ No newline at end of file
+        # Wait for the job to finish or time out.
+        await asyncio.wait_for(asyncio.shield(job.done), timeout=timeout)
+        stdout, stderr = job.output()
+        return_code = job.return_code
+        job.cleanup()
+    except asyncio.TimeoutError:
+        # If we timeout, it means the process is still running: keep draining its output and report when it exits.
+        globals.running_processes.add(job)
+        job.follower = asyncio.create_task(job.follow())
+        # Jobs stopped through the registry (stop_process, shutdown) leave it first: the model asked for those, so no notice.
+        job.done.add_done_callback(lambda _: job.id in globals.running_processes and globals.process_events.append(f"Background process {job.id} exited with return code {job.return_code}."))
+        stdout, stderr = job.output()
+        stdout = f"Process started and running in the background. Use read_process_output to follow its output.\n\nOutput so far:\n{stdout}"
+        for name in job.cursors: job.cursors[name] = job.streams[name].end
+        return_code = "Running"
+    return job.id, f"Process ID: {job.id}\n\nStdout:\n{stdout}\n\nStderr:\n{stderr}\n\nReturn Code: {return_code}"
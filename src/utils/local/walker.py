@@ -0,0 +1,149 @@
+import os, re
+from src.lib.config import config
+from src.lib.data import ignored_folders
+from concurrent.futures import ThreadPoolExecutor
+
+# Directory walker shared by list_files, read_multiple_files and scan_folder.
+# Ignored folders and .gitignore rules are applied while descending, so excluded trees (node_modules, .git, venv...) are never
+# entered. Directories are scanned breadth first, one level at a time in parallel, and files come out in a stable order:
+# shallower files first, then by path. The walk stops as soon as the file-count or byte limit is reached.
+WALK_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+def translate(pattern):
+    # Regex for a glob pattern: * and ? stay within a path segment, ** spans segments.
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        char = pattern[i]
+        if char == "*": parts.append("[^/]*")
+        elif char == "?": parts.append("[^/]")
+        elif char == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1:end]
+            if body[0] in "!^": body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+            continue
+        elif char == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else: parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+def parse_gitignore(text):
+    # (regex, negated, directories only) for every rule, in file order.
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"): continue
+        negated = line.startswith("!")
+        if negated or line.startswith("\\"): line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line: continue
+        # A slash anywhere but at the end anchors the pattern to the directory of the .gitignore.
+        anchored = "/" in line
+        regex = translate(line.lstrip("/"))
+        rules.append((re.compile(regex if anchored else f"(?:.*/)?{regex}"), negated, dir_only))
+    return rules
+
+class IgnoreRules():
+    def __init__(self, scopes=()):
+        # (base directory, rules) from the outermost .gitignore to the innermost.
+        self.scopes = scopes
+
+    @classmethod
+    def for_root(cls, root):
+        # Rules of the .gitignore files between the enclosing repository root and root (exclusive). None outside a repository.
+        if os.path.exists(os.path.join(root, ".git")): return cls()
+        ancestors = []
+        directory = root
+        while not os.path.exists(os.path.join(directory, ".git")):
+            parent = os.path.dirname(directory)
+            if parent == directory: return cls()
+            directory = parent
+            ancestors.append(directory)
+        rules = cls()
+        for directory in reversed(ancestors): rules = rules.child(directory)
+        return rules
+
+    def child(self, directory):
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                rules = parse_gitignore(f.read())
+        except OSError: return self
+        return IgnoreRules((*self.scopes, (directory, rules))) if rules else self
+
+    def ignored(self, path, is_dir):
+        # The last matching rule wins, and inner .gitignore files come last.
+        ignored = False
+        for base, rules in self.scopes:
+            relative = os.path.relpath(path, base).replace(os.sep, "/")
+            if relative.startswith("../"): continue
+            for regex, negated, dir_only in rules:
+                if dir_only and not is_dir: continue
+                if regex.fullmatch(relative): ignored = not negated
+        return ignored
+
+def scan_dir(directory, rules):
+    # Sorted (subdirectories with their rules, files with their sizes) of one directory, without the ignored entries.
+    rules = rules.child(directory)
+    dirs, files = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in ignored_folders and not rules.ignored(entry.path, True): dirs.append(entry.path)
+                    elif entry.is_file() and not rules.ignored(entry.path, False): files.append((entry.path, entry.stat().st_size))
+                except OSError: continue
+    except OSError: pass
+    return [(path, rules) for path in sorted(dirs)], sorted(files)
+
+def list_dir(path="."):
+    # Names of the entries of one directory that are not ignored, directories suffixed with "/".
+    path = os.path.abspath(path)
+    dirs, files = scan_dir(path, IgnoreRules.for_root(path))
+    return sorted([f"{os.path.basename(directory)}/" for directory, _ in dirs] + [os.path.basename(file) for file, _ in files])
+
+def walk(root, recursive=True, max_files=None, max_bytes=None, accept=None):
+    # ([(path, size), ...], truncated) for the files under root that pass accept. truncated is True when a limit stopped the walk.
+    max_files = config.ai.walker.max_files if max_files is None else max_files
+    max_bytes = config.ai.walker.max_bytes if max_bytes is None else max_bytes
+    root = os.path.abspath(root)
+    level = [(root, IgnoreRules.for_root(root))]
+    files = []
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=WALK_WORKERS) as executor:
+        while level:
+            next_level = []
+            for dirs, found in executor.map(lambda item: scan_dir(*item), level):
+                for path, size in found:
+                    if accept is not None and not accept(path): continue
+                    if (max_files and len(files) >= max_files) or (max_bytes and total_bytes + size > max_bytes): return files, True
+                    files.append((path, size))
+                    total_bytes += size
+                next_level += dirs
+            level = next_level if recursive else []
+    return files, False
+
+def match(pattern, recursive=False):
+    # ([(path, size), ...], truncated) for the files matching a glob pattern. Only the directory before the first wildcard is walked.
+    parts = os.path.abspath(pattern).split(os.sep)
+    fixed = next(i for i, part in enumerate(parts) if re.search(r"[*?\[]", part))
+    base = os.sep.join(parts[:fixed]) or os.sep
+    rest = "/".join(parts[fixed:])
+    # Like glob, ** only spans directories when recursive is set.
+    if not recursive: rest = rest.replace("**", "*")
+    regex = re.compile(translate(rest))
+    return walk(base, recursive="/" in rest or "**" in rest, accept=lambda path: regex.fullmatch(os.path.relpath(path, base).replace(os.sep, "/")) is not None)
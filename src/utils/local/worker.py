@@ -1,6 +1,8 @@
-import re, json, difflib
 from rich.panel import Panel
+from src.lib.config import config
+import json, time, asyncio
 import src.lib.globals as globals
+from src.utils.local.edits import plan_edits, render_plan, write_atomic
 from src.services.chat.basics import generate_diff
 from src.utils.basics import logging, console, terminal
 from src.utils.local.folders import validate_files_structure
@@ -8,54 +10,35 @@ from src.services.ai.prompts.worker import generate_edit_instructions
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 
 async def apply_edits(file_path, edit_instructions, original_content):
-    changes_made = False
-    edited_content = original_content
     total_edits = len(edit_instructions)
     failed_edits = []
     console_output = []
+    # Every SEARCH block is located against the original content, then the result is built in a single pass.
+    plan = plan_edits(original_content, edit_instructions, threshold=0.8 if globals.USE_FUZZY_SEARCH else None)
     with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), BarColumn(), TextColumn("[progress.percentage]{task.percentage:>3.0f}%"), console=console) as progress:
         edit_task = progress.add_task("[cyan]Applying edits...", total=total_edits)
-        for i, edit in enumerate(edit_instructions, 1):
-            search_content = edit["search"].strip()
-            replace_content = edit["replace"].strip()
-            similarity = edit["similarity"]
-            # Use regex to find the content, ignoring leading/trailing whitespace.
-            pattern = re.compile(re.escape(search_content), re.DOTALL)
-            match = pattern.search(edited_content)
-            if match or (globals.USE_FUZZY_SEARCH and similarity >= 0.8):
-                if not match:
-                    # If using fuzzy search and no exact match, find the best match
-                    best_match = difflib.get_close_matches(search_content, [edited_content], n=1, cutoff=0.6)
-                    if best_match: match = re.search(re.escape(best_match[0]), edited_content)
-                if match:
-                    # Replace the content using re.sub for more robust replacement.
-                    replace_content_cleaned = re.sub(r'</?SEARCH>|</?REPLACE>', "", replace_content)
-                    edited_content = pattern.sub(replace_content_cleaned, edited_content, count=1)
-                    changes_made = True
-                    # Display the diff for this edit.
-                    diff_result = generate_diff(search_content, replace_content, file_path)
-                    console.print(Panel(diff_result, title=f"Changes in {file_path} ({i}/{total_edits}) - Similarity: {similarity:.2f}", style="cyan"))
-                    console_output.append(f"Edit {i}/{total_edits} applied successfully")
-                else:
-                    message = f"Edit {i}/{total_edits} not applied: content not found (Similarity: {similarity:.2f})"
-                    console_output.append(message)
-                    console.print(Panel(message, style="yellow"))
-                    failed_edits.append(f"Edit {i}: {search_content}")
+        for edit, instruction in zip(plan, edit_instructions):
+            i = edit.number
+            if edit.match:
+                # Display the diff for this edit.
+                diff_result = generate_diff(edit.search, instruction["replace"].strip(), file_path)
+                console.print(Panel(diff_result, title=f"Changes in {file_path} ({i}/{total_edits}) - {edit.match.kind.capitalize()} match: {edit.match.score:.2f}", style="cyan"))
+                console_output.append(f"Edit {i}/{total_edits} applied successfully")
             else:
-                message = f"Edit {i}/{total_edits} not applied: content not found (Similarity: {similarity:.2f})"
+                message = f"Edit {i}/{total_edits} not applied: {edit.error} (Similarity: {instruction["similarity"]:.2f})"
                 console_output.append(message)
                 console.print(Panel(message, style="yellow"))
-                failed_edits.append(f"Edit {i}: {search_content}")
+                failed_edits.append(f"Edit {i}: {edit.search}")
             progress.update(edit_task, advance=1)
-
+    changes_made = any(edit.match for edit in plan)
+    edited_content = render_plan(original_content, plan) if changes_made else original_content
     if not changes_made:
         message = "No changes were applied. The file content already matches the desired state."
         console_output.append(message)
         console.print(Panel(message, style="green"))
     else:
         # Write the changes to the file.
-        with open(file_path, "w") as file:
-            file.write(edited_content)
+        write_atomic(file_path, edited_content)
         message = f"Changes have been written to {file_path}"
         console_output.append(message)
         console.print(Panel(message, style="green"))
@@ -93,7 +76,7 @@ async def edit_and_apply(path, instructions, project_context, is_automode=False,
         return f"Failed to apply changes to {path} after {max_retries} attempts."
     except Exception as e: return f"Error editing/applying to file: {str(e)}"
 
-async def edit_and_apply_multiple(response, files, project_context, is_automode=False):
+async def edit_and_apply_multiple(provider, files, project_context, is_automode=False):
     results = []
     console_outputs = []
     logging.debug(f"edit_and_apply_multiple called with files: {files}")
@@ -103,11 +86,11 @@ async def edit_and_apply_multiple(response, files, project_context, is_automode=
         logging.error(f"Validation error: {ve}")
         return [], f"Error: {ve}"
     logging.info(f"Starting edit_and_apply_multiple with {len(files)} file(s)")
-    for file in files:
-        path = file["path"]
-        instructions = file["instructions"]
-        logging.info(f"Processing file: {path}")
-        try:
+    # Instructions for every file are generated concurrently (bounded by code_editor_concurrency), then applied in order.
+    semaphore = asyncio.Semaphore(max(1, config.ai.code_editor_concurrency))
+    async def generate(path, instructions):
+        async with semaphore:
+            started = time.perf_counter()
             original_content = globals.file_contents.get(path, "")
             if not original_content:
                 logging.info(f"Reading content for file: {path}")
@@ -115,8 +98,17 @@ async def edit_and_apply_multiple(response, files, project_context, is_automode=
                     original_content = f.read()
                 globals.file_contents[path] = original_content
             logging.info(f"Generating edit instructions for file: {path}")
-            edit_instructions = await generate_edit_instructions(response, path, original_content, instructions, project_context, globals.file_contents)
+            edit_instructions = await generate_edit_instructions(provider, path, original_content, instructions, project_context, globals.file_contents)
             logging.debug(f"AI response for {path}: {edit_instructions}")
+            return edit_instructions, time.perf_counter() - started
+    generated = await asyncio.gather(*(generate(file["path"], file["instructions"]) for file in files), return_exceptions=True)
+    for file, outcome in zip(files, generated):
+        path = file["path"]
+        logging.info(f"Processing file: {path}")
+        try:
+            if isinstance(outcome, BaseException): raise outcome
+            edit_instructions, generate_seconds = outcome
+            timings = {"generate_seconds": round(generate_seconds, 3)}
             if not isinstance(edit_instructions, list) or not all(isinstance(item, dict) for item in edit_instructions): terminal("e", "Invalid edit_instructions format. Expected a list of dictionaries.", exitScript=True)
             if edit_instructions:
                 console.print(Panel(f"File: {path}\nThe following SEARCH/REPLACE blocks have been generated:", title="Edit Instructions", style="cyan"))
@@ -124,7 +116,15 @@ async def edit_and_apply_multiple(response, files, project_context, is_automode=
                     console.print(f"Block {i}:")
                     console.print(Panel(f"SEARCH:\n{block["search"]}\n\nREPLACE:\n{block["replace"]}\nSimilarity: {block["similarity"]:.2f}", expand=False))
                 logging.info(f"Applying edits to file: {path}")
-                edited_content, changes_made, failed_edits, console_output = await apply_edits(path, edit_instructions, original_content)
+                started = time.perf_counter()
+                # Apply on top of the current content, in case an earlier entry already edited the same file. The store may have
+                # evicted it meanwhile, the disk has it too.
+                current_content = globals.file_contents.get(path)
+                if current_content is None:
+                    with open(path, "r") as f:
+                        current_content = f.read()
+                edited_content, changes_made, failed_edits, console_output = await apply_edits(path, edit_instructions, current_content)
+                timings["apply_seconds"] = round(time.perf_counter() - started, 3)
                 console_outputs.append(console_output)
                 if changes_made:
                     globals.file_contents[path] = edited_content
@@ -139,28 +139,32 @@ async def edit_and_apply_multiple(response, files, project_context, is_automode=
                             "status": "partial_success",
                             "message": f"Some changes applied to {path}, but some edits failed.",
                             "failed_edits": failed_edits,
-                            "edited_content": edited_content
+                            "edited_content": edited_content,
+                            "timings": timings
                         })
                     else:
                         results.append({
                             "path": path,
                             "status": "success",
                             "message": f"All changes successfully applied to {path}",
-                            "edited_content": edited_content
+                            "edited_content": edited_content,
+                            "timings": timings
                         })
                 else:
                     logging.warning(f"No changes applied to file: {path}")
                     results.append({
                         "path": path,
                         "status": "no_changes",
-                        "message": f"No changes could be applied to {path}. Please review the edit instructions and try again."
+                        "message": f"No changes could be applied to {path}. Please review the edit instructions and try again.",
+                        "timings": timings
                     })
             else:
                 logging.warning(f"No edit instructions generated for file: {path}")
                 results.append({
                     "path": path,
                     "status": "no_instructions",
-                    "message": f"No edit instructions generated for {path}"
+                    "message": f"No edit instructions generated for {path}",
+                    "timings": timings
                 })
         except Exception as e:
             logging.error(f"Error editing/applying to file {path}: {str(e)}")
@@ -174,4 +178,4 @@ async def edit_and_apply_multiple(response, files, project_context, is_automode=
             console_outputs.append(error_message)
     logging.info("Completed edit_and_apply_multiple")
     logging.debug(f"Results: {results}")
-    return results, "\n".join(console_outputs)
\ No newline at end of file
+    return results, "\n".join(console_outputs)
@@ -0,0 +1,100 @@
+import os, json, time, asyncio, datetime, functools, itertools, threading, contextvars
+from contextlib import contextmanager
+from src.lib.config import config
+
+# Spans around every turn, provider call, tool execution and text-to-speech run. Each span records its duration, its parent and,
+# for provider calls, the token counts and cache hits of the response. Finished spans are appended to a trace file per session
+# (ai.telemetry.trace_dir) as JSON lines or in the Chrome trace format, which chrome://tracing and Perfetto open as is.
+# In Chrome traces every asyncio task gets its own row, so concurrent tool calls and code-editor requests show side by side.
+current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span():
+    __slots__ = ("id", "parent", "name", "category", "args", "start", "duration", "lane")
+
+    def __init__(self, id, parent, name, category, args, lane):
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.args = args
+        self.lane = lane
+        self.start = time.perf_counter()
+        self.duration = None
+
+class Tracer():
+    def __init__(self, directory=None, format="chrome"):
+        self.directory = directory
+        self.format = format
+        self.path = None
+        self.origin = time.perf_counter()
+        # Finished spans not written yet.
+        self.pending = []
+        self.__ids = itertools.count(1)
+        # Row of every task (or thread) seen since the previous flush.
+        self.__lanes = {}
+        self.__lock = threading.Lock()
+
+    def lane(self):
+        try: key = id(asyncio.current_task())
+        except RuntimeError: key = threading.get_ident()
+        with self.__lock: return self.__lanes.setdefault(key, len(self.__lanes) + 1)
+
+    @contextmanager
+    def span(self, name, category, **args):
+        parent = current_span.get()
+        span = Span(next(self.__ids), parent.id if parent else None, name, category, args, self.lane())
+        token = current_span.set(span)
+        try: yield span
+        except BaseException as e:
+            span.args["error"] = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            current_span.reset(token)
+            with self.__lock: self.pending.append(span)
+
+    def event(self, span):
+        if self.format == "jsonl": return {"id": span.id, "parent": span.parent, "name": span.name, "category": span.category, "start": round(span.start - self.origin, 6), "duration": round(span.duration, 6), **span.args}
+        return {"name": span.name, "cat": span.category, "ph": "X", "ts": round((span.start - self.origin) * 1e6), "dur": round(span.duration * 1e6), "pid": os.getpid(), "tid": span.lane, "args": {"id": span.id, "parent": span.parent, **span.args}}
+
+    def flush(self):
+        # Write the pending spans to the session's trace file and return them.
+        # Lanes start over too: the rows of finished tasks are reused instead of growing for the whole session.
+        with self.__lock:
+            spans, self.pending = self.pending, []
+            self.__lanes = {}
+        if not spans or not self.directory: return spans
+        try:
+            if self.path is None:
+                os.makedirs(self.directory, exist_ok=True)
+                extension = "jsonl" if self.format == "jsonl" else "json"
+                self.path = os.path.join(self.directory, datetime.datetime.now().strftime(f"trace-%Y%m%d-%H%M%S.{extension}"))
+                # The closing bracket of a Chrome trace is optional, so the array can be appended to for the whole session.
+                if self.format != "jsonl":
+                    with open(self.path, "w", encoding="utf-8") as f:
+                        f.write("[\n")
+            with open(self.path, "a", encoding="utf-8") as f:
+                for span in sorted(spans, key=lambda span: span.start):
+                    f.write(json.dumps(self.event(span), default=str) + ("\n" if self.format == "jsonl" else ",\n"))
+        except OSError: pass
+        return spans
+
+tracer = Tracer(config.ai.telemetry.trace_dir if config.ai.telemetry.enabled else None, config.ai.telemetry.format)
+
+def span(name, category, **args):
+    return tracer.span(name, category, **args)
+
+def traced(name, category):
+    # Run an async function inside a span.
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name, category): return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_usage(**counts):
+    # Add the token counts (and model-reported timings) of a provider response to the current span.
+    span = current_span.get()
+    if span is None: return
+    for key, value in counts.items(): span.args[key] = span.args.get(key, 0) + value
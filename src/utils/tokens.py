@@ -0,0 +1,50 @@
+import re, json
+from src.lib.config import config
+
+# Local token estimator, used to size requests before they are sent. It splits text the way BPE tokenizers roughly do (words,
+# short digit runs, single punctuation marks) and charges long words one extra token per 6 characters, which errs slightly on
+# the high side for both English and code.
+PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\s+")
+# Flat cost of an image block and per-message framing overhead.
+IMAGE_TOKENS = 1600
+MESSAGE_TOKENS = 4
+
+class ContextOverflowError(Exception):
+    pass
+
+def count_text_tokens(text):
+    if not text: return 0
+    tokens = 0
+    for piece in PIECES.findall(text):
+        if piece.isspace(): tokens += piece.count("\n") if "\n" in piece else 0
+        else: tokens += 1 + (len(piece) - 1) // 6
+    return tokens
+
+def count_content_tokens(content):
+    # Text, or a list of Anthropic content blocks (text, image, tool_use, tool_result).
+    if content is None: return 0
+    if isinstance(content, str): return count_text_tokens(content)
+    if not isinstance(content, list): return count_text_tokens(json.dumps(content, default=str))
+    tokens = 0
+    for block in content:
+        if not isinstance(block, dict): tokens += count_text_tokens(str(block))
+        elif block.get("type") == "image": tokens += IMAGE_TOKENS
+        elif block.get("type") == "tool_use": tokens += count_text_tokens(block.get("name", "")) + count_text_tokens(json.dumps(block.get("input", {}), default=str))
+        elif block.get("type") == "tool_result": tokens += count_content_tokens(block.get("content"))
+        else: tokens += count_text_tokens(block.get("text", ""))
+    return tokens
+
+def count_message_tokens(message):
+    tokens = MESSAGE_TOKENS + count_content_tokens(message.get("content"))
+    if message.get("tool_calls"): tokens += count_text_tokens(json.dumps(message["tool_calls"], default=str))
+    if message.get("images"): tokens += IMAGE_TOKENS * len(message["images"])
+    return tokens
+
+def count_request_tokens(messages=(), system=None, tools=None):
+    tokens = count_content_tokens(system)
+    if tools: tokens += count_text_tokens(json.dumps(tools, default=str))
+    return tokens + sum(count_message_tokens(message) for message in messages)
+
+def context_window(provider, model):
+    # Context window of a model, from ai.providers.<provider>.context_windows.<model> in config.json (e.g. "main_model").
+    return getattr(getattr(config.ai.providers, provider).context_windows, model)
@@ -0,0 +1,96 @@
+from src.lib.config import config
+from src.utils.telemetry import record_usage
+
+# Token and cost ledger. Every provider response is recorded once, as a call, and added to the totals of the current turn and of
+# the session, per model role (main_model, tool_checker_model, ...). Prices come from ai.providers.<provider>.pricing, in dollars
+# per million tokens and keyed by model name; models without a price (local Ollama models) cost nothing.
+ROLES = {"main_model": "Main Model", "tool_checker_model": "Tool Checker", "code_editor_model": "Code Editor", "code_execution_model": "Code Execution", "summary_model": "Summary"}
+NANOSECONDS = 1_000_000_000
+
+class Usage():
+    __slots__ = ("input", "output", "cache_write", "cache_read", "seconds", "cost", "calls", "response_hits", "response_misses")
+
+    def __init__(self):
+        self.input = 0
+        self.output = 0
+        self.cache_write = 0
+        self.cache_read = 0
+        self.seconds = 0.0
+        self.cost = 0.0
+        self.calls = 0
+        # Lookups in the response cache (src/utils/cache.py).
+        self.response_hits = 0
+        self.response_misses = 0
+
+    def add(self, other):
+        for key in self.__slots__: setattr(self, key, getattr(self, key) + getattr(other, key))
+        return self
+
+    @property
+    def total(self):
+        return self.input + self.output + self.cache_write + self.cache_read
+
+    @property
+    def cache_hit_ratio(self):
+        # Share of prompt tokens served from the prompt cache.
+        prompt = self.input + self.cache_write + self.cache_read
+        return self.cache_read / prompt if prompt else 0.0
+
+def model_name(provider, role):
+    return getattr(getattr(config.ai.providers, provider).models, role, None)
+
+def price(provider, model):
+    pricing = getattr(getattr(config.ai.providers, provider), "pricing", None)
+    return getattr(pricing, model, None) if pricing is not None and model else None
+
+def parse_response(response):
+    # Usage of a provider response: an Anthropic usage object, or a final Ollama response with its counts and durations (in ns).
+    usage = Usage()
+    usage.calls = 1
+    if hasattr(response, "input_tokens"):
+        usage.input = response.input_tokens
+        usage.output = response.output_tokens
+        usage.cache_write = getattr(response, "cache_creation_input_tokens", 0) or 0
+        usage.cache_read = getattr(response, "cache_read_input_tokens", 0) or 0
+        return usage, {}
+    usage.input = response.get("prompt_eval_count") or 0
+    usage.output = response.get("eval_count") or 0
+    usage.seconds = (response.get("total_duration") or 0) / NANOSECONDS
+    timings = {key: round((response.get(key) or 0) / NANOSECONDS, 6) for key in ("load_duration", "prompt_eval_duration", "eval_duration") if response.get(key)}
+    return usage, timings
+
+class UsageLedger():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = []
+        self.session = {role: Usage() for role in ROLES}
+        self.start_turn()
+
+    def start_turn(self):
+        self.turn = {role: Usage() for role in ROLES}
+
+    def record(self, role, response, provider=None):
+        # Record one provider response for a model role. Returns the call's usage.
+        provider = provider or config.ai.default_provider
+        model = model_name(provider, role)
+        usage, timings = parse_response(response)
+        rates = price(provider, model)
+        if rates is not None: usage.cost = sum(getattr(usage, key) * getattr(rates, key, 0) for key in ("input", "output", "cache_write", "cache_read")) / 1_000_000
+        self.calls.append({"role": role, "provider": provider, "model": model, "usage": usage})
+        self.turn[role].add(usage)
+        self.session[role].add(usage)
+        record_usage(input=usage.input, output=usage.output, cache_write=usage.cache_write, cache_read=usage.cache_read, **timings)
+        return usage
+
+    def record_cache(self, role, hit):
+        for usage in (self.turn[role], self.session[role]):
+            if hit: usage.response_hits += 1
+            else: usage.response_misses += 1
+
+    @staticmethod
+    def total(usages):
+        total = Usage()
+        for usage in usages.values(): total.add(usage)
+        return total
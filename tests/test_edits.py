@@ -0,0 +1,53 @@
+import os, stat
+from src.utils.local.edits import plan_edits, render_plan, write_atomic, NEW_FILE_MODE
+
+def apply(content, edits, threshold=0.8):
+    plan = plan_edits(content, [{"search": search, "replace": replace} for search, replace in edits], threshold)
+    return plan, render_plan(content, plan)
+
+def test_edits_are_applied_in_file_order():
+    plan, result = apply("one\ntwo\nthree\n", [("three", "3"), ("one", "1")])
+    assert [edit.error for edit in plan] == [None, None]
+    assert result == "1\ntwo\n3\n"
+
+def test_repeated_blocks_target_successive_occurrences():
+    plan, result = apply("x = 0\nx = 0\nx = 0\n", [("x = 0", "x = 1"), ("x = 0", "x = 2")])
+    assert result == "x = 1\nx = 2\nx = 0\n"
+
+def test_edits_match_the_original_content_not_earlier_replacements():
+    plan, result = apply("a\nb\n", [("a", "b"), ("b", "c")])
+    assert result == "b\nc\n"
+
+def test_overlapping_edit_is_rejected():
+    plan, result = apply("alpha beta gamma\n", [("alpha beta", "A"), ("beta gamma", "B")])
+    assert plan[0].match is not None
+    assert plan[1].match is None
+    assert plan[1].error == "overlaps edit 1"
+    assert result == "A gamma\n"
+
+def test_missing_block_is_reported_and_leaves_the_content_alone():
+    plan, result = apply("a\nb\n", [("zzz", "y")], threshold=None)
+    assert plan[0].error == "content not found"
+    assert result == "a\nb\n"
+
+def test_search_and_replace_markers_are_stripped_from_replacements():
+    plan, result = apply("a\n", [("a", "<REPLACE>b</REPLACE>")])
+    assert result == "b\n"
+
+def test_write_atomic_gives_new_files_the_default_mode(tmp_path):
+    path = tmp_path / "new.txt"
+    write_atomic(str(path), "hello")
+    assert path.read_text() == "hello"
+    assert stat.S_IMODE(os.stat(path).st_mode) == NEW_FILE_MODE
+
+def test_write_atomic_keeps_the_mode_of_existing_files(tmp_path):
+    path = tmp_path / "script.sh"
+    path.write_text("old")
+    os.chmod(path, 0o755)
+    write_atomic(str(path), "new")
+    assert path.read_text() == "new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o755
+
+def test_write_atomic_leaves_no_temporary_files(tmp_path):
+    write_atomic(str(tmp_path / "a.txt"), "a")
+    assert os.listdir(tmp_path) == ["a.txt"]
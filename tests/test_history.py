@@ -0,0 +1,85 @@
+import asyncio
+from src.services.chat.history import ConversationHistory, MIRRORED_NOTE, EVICTED_NOTE
+
+def turn(number, words=40):
+    return [{"role": "user", "content": f"question {number} " + "word " * words}, {"role": "assistant", "content": f"answer {number} " + "word " * words}]
+
+def tool_turn(number, result):
+    return [
+        {"role": "user", "content": f"question {number}"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": f"t{number}", "name": "list_files", "input": {}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": f"t{number}", "content": [{"type": "text", "text": result}]}]},
+        {"role": "assistant", "content": f"answer {number}"}
+    ]
+
+def history_of(budget, turns, keep_recent=2):
+    history = ConversationHistory(budget, keep_recent=keep_recent)
+    for messages in turns: history.extend(messages)
+    return history
+
+def result_texts(history):
+    return [block["content"][0]["text"] for message in history.messages() if isinstance(message["content"], list) for block in message["content"] if block.get("type") == "tool_result"]
+
+def test_results_mirrored_in_the_system_prompt_are_reduced_on_append():
+    history = history_of(10_000, [tool_turn(1, "File 'a.py' has been read and stored in the system prompt.")])
+    assert result_texts(history) == [MIRRORED_NOTE]
+
+def test_within_budget_nothing_changes():
+    history = history_of(10_000, [turn(1), turn(2)])
+    asyncio.run(history.compact())
+    assert len(history) == 4
+    assert history.summary is None
+
+def test_old_tool_results_are_evicted_before_turns_are_dropped():
+    history = history_of(0, [tool_turn(1, "x " * 400), turn(2, 5)], keep_recent=2)
+    budget = history.total_tokens - 300
+    history.token_budget = budget
+    asyncio.run(history.compact())
+    assert result_texts(history) == [EVICTED_NOTE]
+    assert len(history) == 6
+    assert history.total_tokens <= budget
+
+def test_oldest_turns_are_summarized_when_eviction_is_not_enough():
+    seen = []
+    async def summarize(text):
+        seen.append(text)
+        return "summary of turn 1"
+    history = history_of(0, [turn(1), turn(2), turn(3)])
+    history.token_budget = history.total_tokens - 10
+    asyncio.run(history.compact(summarize))
+    assert history.summary == "summary of turn 1"
+    assert "USER: question 1" in seen[0]
+    messages = history.messages()
+    assert messages[0]["content"].endswith("summary of turn 1")
+    assert messages[2]["content"].startswith("question 2")
+
+def test_turns_are_cut_only_where_a_user_turn_starts():
+    history = history_of(0, [tool_turn(1, "x " * 200), turn(2)], keep_recent=2)
+    history.token_budget = history.total_tokens - 250
+    asyncio.run(history.compact())
+    first = history[0]
+    assert first["role"] == "user" and isinstance(first["content"], str)
+
+def test_the_previous_summary_is_passed_on():
+    seen = []
+    async def summarize(text):
+        seen.append(text)
+        return f"summary {len(seen)}"
+    history = history_of(0, [turn(1), turn(2), turn(3)])
+    history.summary = "summary 0"
+    history.token_budget = history.total_tokens - 10
+    asyncio.run(history.compact(summarize))
+    assert seen[0].startswith("Previous summary:\nsummary 0")
+
+def test_failed_summary_keeps_the_history_and_the_old_summary():
+    async def summarize(text): raise ConnectionError("summary model down")
+    history = history_of(0, [turn(1), turn(2), turn(3)])
+    history.summary = "old summary"
+    history.token_budget = history.total_tokens - 10
+    try: asyncio.run(history.compact(summarize))
+    except ConnectionError: pass
+    assert len(history) == 6
+    # What run_turn falls back to: drop the oldest turns without a new summary.
+    asyncio.run(history.compact())
+    assert history.summary == "old summary"
+    assert history.total_tokens <= history.token_budget
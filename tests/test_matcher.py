@@ -0,0 +1,59 @@
+from src.utils.local.matcher import LineIndex, find_block, find_exact, find_normalized, find_fuzzy
+
+CONTENT = """def load(path):
+    with open(path) as f:
+        return f.read()
+
+def save(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+"""
+
+def test_exact_match_spans_the_search_text():
+    search = 'with open(path, "w") as f:'
+    match = find_block(CONTENT, search)
+    assert match.kind == "exact"
+    assert match.score == 1.0
+    assert CONTENT[match.start:match.end] == search
+
+def test_exact_match_returns_the_first_occurrence_and_can_resume():
+    first = find_exact(CONTENT, "with open(path")
+    second = find_exact(CONTENT, "with open(path", first.start + 1)
+    assert first.start < second.start
+    assert find_exact(CONTENT, "with open(path", second.start + 1) is None
+
+def test_empty_search_never_matches():
+    assert find_exact(CONTENT, "") is None
+    assert find_block(CONTENT, "   \n  ") is None
+
+def test_whitespace_match_ignores_indentation_and_inner_spaces():
+    search = "def save(path,  data):\n  with open(path, \"w\") as f:\n      f.write(data)"
+    match = find_block(CONTENT, search)
+    assert match.kind == "whitespace"
+    assert CONTENT[match.start:match.end] == "def save(path, data):\n    with open(path, \"w\") as f:\n        f.write(data)"
+
+def test_whitespace_match_skips_blank_lines_in_the_file():
+    match = find_normalized(LineIndex(CONTENT), "return f.read()\ndef save(path, data):")
+    assert match is not None
+    assert CONTENT[match.start:match.end] == "return f.read()\n\ndef save(path, data):"
+
+def test_fuzzy_match_tolerates_small_differences():
+    search = "def save(path, data):\n    with open(path, 'w') as f:\n        f.write(data)"
+    match = find_block(CONTENT, search, threshold=0.8)
+    assert match.kind == "fuzzy"
+    assert 0.8 <= match.score < 1.0
+    assert CONTENT[match.start:match.end].startswith("def save(path, data):")
+
+def test_fuzzy_matching_is_skipped_without_a_threshold():
+    search = "def save(path, data):\n    with open(path, 'w') as f:\n        f.write(data)"
+    assert find_block(CONTENT, search, threshold=None) is None
+
+def test_unrelated_block_does_not_match():
+    assert find_block(CONTENT, "class Missing(object):\n    pass") is None
+    assert find_fuzzy(LineIndex(CONTENT), "x = 1\n" * 20) is None
+
+def test_ambiguous_whitespace_match_picks_the_first_occurrence():
+    content = "a = 1\nb = 2\n\na = 1\nb = 2\n"
+    match = find_block(content, "a  =  1\nb = 2")
+    assert match.kind == "whitespace"
+    assert match.start == 0
@@ -0,0 +1,25 @@
+from src.utils.local.search import terms, chunk_terms
+
+def test_dunder_names_are_indexed_without_underscores():
+    assert terms("__evict") == ["__evict", "evict"]
+    assert terms("__init__") == ["__init__", "init"]
+
+def test_underscore_prefixed_names_are_indexed_with_their_parts():
+    assert terms("_paths") == ["_paths", "paths"]
+    assert terms("_search_lines") == ["_search_lines", "search_lines", "search", "lines"]
+
+def test_snake_case_names_are_split():
+    assert terms("read_multiple_files") == ["read_multiple_files", "read", "multiple", "files"]
+
+def test_camel_case_names_are_split():
+    assert terms("FileStore") == ["filestore", "file", "store"]
+    assert terms("HTTPServer") == ["httpserver", "http", "server"]
+
+def test_plain_words_and_numbers_are_single_terms():
+    assert terms("store 42") == ["store", "42"]
+    assert terms("_") == ["_"]
+
+def test_chunks_count_terms_per_block_of_lines():
+    chunks = chunk_terms("\n".join(f"line_{i} = {i}" for i in range(25)))
+    assert [(start, end) for start, end, _ in chunks] == [(1, 20), (21, 25)]
+    assert chunks[0][2]["line"] == 20
@@ -0,0 +1,98 @@
+import os
+from src.utils.local.store import FileStore
+
+def write(path, content, mtime_ns=None):
+    path.write_text(content)
+    if mtime_ns is not None: os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+def test_load_reports_read_then_cached(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha")
+    assert store.load(path) == "read"
+    assert store.load(path) == "cached"
+    assert store[path] == "alpha"
+    assert store.total_bytes == 5
+
+def test_changed_file_is_reread(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha", 1_000_000_000)
+    store.load(path)
+    write(tmp_path / "a.txt", "omega!", 2_000_000_000)
+    assert not store.is_fresh(path)
+    assert store.load(path) == "refreshed"
+    assert store[path] == "omega!"
+    assert store.total_bytes == 6
+
+def test_touched_but_unchanged_file_keeps_its_entry(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha", 1_000_000_000)
+    store.load(path)
+    write(tmp_path / "a.txt", "alpha", 2_000_000_000)
+    assert store.load(path) == "cached"
+    assert store.is_fresh(path)
+
+def test_same_size_change_is_caught_by_the_mtime(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha", 1_000_000_000)
+    store.load(path)
+    write(tmp_path / "a.txt", "bravo", 2_000_000_000)
+    assert store[path] == "bravo"
+
+def test_deleted_file_leaves_the_store(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha")
+    store.load(path)
+    os.remove(path)
+    assert path not in store
+    assert len(store) == 0
+    assert store.total_bytes == 0
+
+def test_least_recently_referenced_files_are_evicted_first(tmp_path):
+    store = FileStore(max_bytes=10)
+    a = write(tmp_path / "a.txt", "aaaa")
+    b = write(tmp_path / "b.txt", "bbbb")
+    c = write(tmp_path / "c.txt", "cccc")
+    store.load(a)
+    store.load(b)
+    store[a]
+    store.load(c)
+    assert store.keys() == [a, c]
+    assert store.take_evicted() == [b]
+    assert store.take_evicted() == []
+    assert store.total_bytes == 8
+
+def test_listing_does_not_count_as_a_reference(tmp_path):
+    store = FileStore(max_bytes=10)
+    a = write(tmp_path / "a.txt", "aaaa")
+    b = write(tmp_path / "b.txt", "bbbb")
+    store.load(a)
+    store.load(b)
+    store.items()
+    store.load(write(tmp_path / "c.txt", "cccc"))
+    assert a not in store.keys()
+
+def test_a_file_larger_than_the_budget_is_kept_alone(tmp_path):
+    store = FileStore(max_bytes=4)
+    store.load(write(tmp_path / "a.txt", "aa"))
+    big = write(tmp_path / "big.txt", "x" * 10)
+    store.load(big)
+    assert store.keys() == [big]
+
+def test_set_item_records_written_content_without_rereading(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "new content")
+    store[path] = "new content"
+    assert store.is_fresh(path)
+    assert store.load(path) == "cached"
+
+def test_delete_and_clear(tmp_path):
+    store = FileStore()
+    path = write(tmp_path / "a.txt", "alpha")
+    store.load(path)
+    del store[path]
+    assert not store
+    store.load(path)
+    store.clear()
+    assert len(store) == 0
+    assert store.total_bytes == 0
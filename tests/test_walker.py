@@ -0,0 +1,95 @@
+import os
+from src.utils.local.walker import walk, match, list_dir, parse_gitignore, translate
+
+def tree(root, files):
+    for path, content in files.items():
+        full = root / path
+        full.parent.mkdir(parents=True, exist_ok=True)
+        full.write_text(content)
+    (root / ".git").mkdir(exist_ok=True)
+    return root
+
+def relative(root, found):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path, _ in found]
+
+def test_translate_keeps_single_stars_within_a_segment():
+    import re
+    assert re.fullmatch(translate("*.py"), "a.py")
+    assert not re.fullmatch(translate("*.py"), "src/a.py")
+    assert re.fullmatch(translate("**/a.py"), "a.py")
+    assert re.fullmatch(translate("**/a.py"), "src/deep/a.py")
+
+def test_files_come_out_shallow_first_then_by_path(tmp_path):
+    root = tree(tmp_path, {"b.txt": "", "a.txt": "", "src/c.py": "", "src/deep/d.py": ""})
+    found, truncated = walk(str(root))
+    assert relative(root, found) == ["a.txt", "b.txt", "src/c.py", "src/deep/d.py"]
+    assert not truncated
+
+def test_ignored_folders_are_never_entered(tmp_path):
+    root = tree(tmp_path, {"node_modules/x.js": "", "__pycache__/a.pyc": "", "main.py": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == ["main.py"]
+
+def test_gitignore_negation_reincludes_a_file(tmp_path):
+    root = tree(tmp_path, {".gitignore": "*.log\n!keep.log\n", "a.log": "", "keep.log": "", "main.py": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == [".gitignore", "keep.log", "main.py"]
+
+def test_later_rules_win(tmp_path):
+    root = tree(tmp_path, {".gitignore": "!keep.log\n*.log\n", "keep.log": "", "main.py": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == [".gitignore", "main.py"]
+
+def test_directory_patterns_only_match_directories(tmp_path):
+    root = tree(tmp_path, {".gitignore": "build/\n", "build/out.o": "", "src/build": "", "main.py": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == [".gitignore", "main.py", "src/build"]
+
+def test_anchored_patterns_only_match_at_their_gitignore(tmp_path):
+    root = tree(tmp_path, {".gitignore": "/docs\n", "docs/a.md": "", "src/docs/b.md": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == [".gitignore", "src/docs/b.md"]
+
+def test_nested_gitignore_applies_to_its_own_directory(tmp_path):
+    root = tree(tmp_path, {"pkg/.gitignore": "*.tmp\n", "pkg/a.tmp": "", "pkg/a.py": "", "top.tmp": ""})
+    found, _ = walk(str(root))
+    assert relative(root, found) == ["top.tmp", "pkg/.gitignore", "pkg/a.py"]
+
+def test_rules_of_enclosing_repository_apply_below_its_root(tmp_path):
+    root = tree(tmp_path, {".gitignore": "*.log\n", "sub/a.log": "", "sub/a.py": ""})
+    found, _ = walk(str(root / "sub"))
+    assert relative(root, found) == ["sub/a.py"]
+
+def test_limits_truncate_the_walk(tmp_path):
+    root = tree(tmp_path, {f"f{i}.txt": "x" * 10 for i in range(5)})
+    found, truncated = walk(str(root), max_files=3)
+    assert len(found) == 3 and truncated
+    found, truncated = walk(str(root), max_bytes=25)
+    assert len(found) == 2 and truncated
+    found, truncated = walk(str(root), max_files=0, max_bytes=0)
+    assert len(found) == 5 and not truncated
+
+def test_match_only_recurses_for_double_star(tmp_path):
+    root = tree(tmp_path, {"a.py": "", "src/b.py": "", "src/c.txt": ""})
+    found, _ = match(str(root / "*.py"))
+    assert relative(root, found) == ["a.py"]
+    found, _ = match(str(root / "**" / "*.py"), recursive=True)
+    assert relative(root, found) == ["a.py", "src/b.py"]
+
+def test_list_dir_marks_directories(tmp_path):
+    root = tree(tmp_path, {".gitignore": "*.log\n", "a.log": "", "src/b.py": "", "c.py": ""})
+    assert list_dir(str(root)) == [".gitignore", "c.py", "src/"]
+
+def test_parse_gitignore_skips_comments_and_blank_lines():
+    rules = parse_gitignore("# comment\n\n*.pyc\n!keep.pyc\nbuild/\n")
+    assert [(negated, dir_only) for _, negated, dir_only in rules] == [(False, False), (True, False), (False, True)]
+
+def test_scan_folder_reports_a_truncated_walk(tmp_path, monkeypatch):
+    from src.lib.config import config
+    from src.utils.local.folders import scan_folder
+    root = tree(tmp_path / "project", {f"f{i}.txt": "text" for i in range(5)})
+    monkeypatch.setattr(config.ai.walker, "max_files", 2)
+    output = tmp_path / "scan.md"
+    result = scan_folder(str(root), str(output))
+    assert "Only the first 2 files were scanned" in result
+    assert "Only the first 2 files were scanned" in output.read_text()